@@ -1,201 +1,298 @@
-import struct
-import enum
-import math
 import sys
 import csv
-from dataclasses import dataclass, field
-
-inpath = sys.argv[1]
-outpath = sys.argv[2]
-
-@dataclass
-class Vector2f:
-    x: float
-    y: float
-
-    @staticmethod
-    def zero():
-        return Vector2f(0, 0)
-
-'''
-@dataclass
-class Vector3f:
-    x: float
-    y: float
-    z: float
-
-    @staticmethod
-    def zero():
-        return Vector3f(0, 0, 0)
-
-
-@dataclass
-class Matrix33f:
-    xx: float
-    xy: float
-    xz: float
-    yx: float
-    yy: float
-    yz: float
-    zx: float
-    zy: float
-    zz: float
-
-    @staticmethod
-    def ident():
-        return Matrix33f(1, 0, 0,
-                         0, 1, 0,
-                         0, 0, 1)
-
-
-@dataclass
-class Gyro:
-    direction: Matrix33f
-    ang_vel: Vector3f
-
-    @staticmethod
-    def zero():
-        return Gyro(Matrix33f.ident(), Vector3f.zero())
-'''
+import math
+from dataclasses import dataclass
+
+import tsvtas
+from tsvtas.compiler import interpolate, EASINGS
+from tsvtas.frames import Joystick
+from tsvtas.vocabulary import NXTAS_TOKENS, MOTION_TOKENS
+
+#converts an nx-TAS script to a TSV-TAS script in one pass over its lines, writing each row as soon as no later line can change it
+#so that recordings of any length convert in linear time with constant memory
+#usage: python3 nx-tas-to-tsv-tas.py [-c] [path to nx-TAS file] [path to output file]
+#-c compresses the script: repeating patterns of rows become / loops, stick sweeps become -> interpolations and runs of short rows changing only buttons become | sequences,
+#each kept only if compiling it to a LunaKit and an nx-TAS script gives the same frames as the rows it replaces
+
+ZERO_STICK = (0, 0)
+
+COMPRESS_LOOKAHEAD = 4096 #rows read ahead of the row being compressed, which bounds the memory compression uses and the length of one compressed row
+MAX_LOOP_ROWS = 8 #most rows in one iteration of a loop
+MIN_LOOP_REPEATS = 3 #fewest iterations worth writing as a loop
+MIN_RAMP_FRAMES = 4 #fewest frames worth writing as an interpolation
+MAX_SEQUENCE_ROWS = 16 #most rows in one sequence
+MAX_SEQUENCE_DURATION = 4 #longest row that is put in a sequence
+RAMP_NUDGE = 0.001 #stick units the ends of an interpolation are pushed away from the center, so rounding toward zero lands on the recorded value
+VERIFY_OPTIONS = (tsvtas.CompileOptions(), tsvtas.CompileOptions(nxtas=True)) #motion macros overwrite each other in LunaKit scripts but not in nx-TAS scripts, so both are checked
 
 @dataclass
 class Frame:
     duration: int
     buttons: list[str]
-    left_stick: Vector2f
-    right_stick: Vector2f
-    #accel_left: Vector3f
-    #accel_right: Vector3f
-    #gyro_left: Gyro
-    #gyro_right: Gyro
-
-    def to_array(self):
+    left_stick: tuple #(x, y)
+    right_stick: tuple #(x, y)
+
+    def to_array(self, max_buttons):
         arr = []
         arr.append(self.duration)
         for button in self.buttons:
             arr.append(button)
         for i in range(max_buttons - len(self.buttons)):
             arr.append("")
-        if (self.left_stick == Vector2f.zero()):
+        if (self.left_stick == ZERO_STICK):
             arr.append("")
         else:
-            arr.append("lsx(" + str(self.left_stick.x) + "; " + str(self.left_stick.y) + ")")
-        if (self.right_stick == Vector2f.zero()):
+            arr.append("lsx(" + str(self.left_stick[0]) + "; " + str(self.left_stick[1]) + ")")
+        if (self.right_stick == ZERO_STICK):
             arr.append("")
         else:
-            arr.append("rsx(" + str(self.right_stick.x) + "; " + str(self.right_stick.y) + ")")
+            arr.append("rsx(" + str(self.right_stick[0]) + "; " + str(self.right_stick[1]) + ")")
 
         return arr
 
-max_buttons = 0 #max buttons in a frame
-
-frame_idx_old = -1
-
-frames = []
-
-with open(inpath) as infile:
-    for line in infile:
-        frame_idx, buttons, left_stick, right_stick = line.split()
-        frame_idx = int(frame_idx)
-        buttons = buttons.split(";")
-        left_stick = left_stick.split(";")
-        right_stick = right_stick.split(";")
-        #accel_left = accel_left.split(";")
-        #accel_right = accel_right.split(";")
-        #gyro_dir_left = gyro_dir_left.split(";")
-        #angvel_left = angvel_left.split(";")
-        #gyro_dir_right = gyro_dir_right.split(";")
-        #angvel_right = angvel_right.split(";")
-
-        button_list = []
-        for button in buttons:
-            if button == "KEY_A": button_list.append("a")
-            elif button == "KEY_B": button_list.append("b")
-            elif button == "KEY_X": button_list.append("x")
-            elif button == "KEY_Y": button_list.append("y")
-            elif button == "KEY_L": button_list.append("m-d")
-            elif button == "KEY_R": button_list.append("r")
-            elif button == "KEY_ZL": button_list.append("zl")
-            elif button == "KEY_ZR": button_list.append("zr")
-            elif button == "KEY_PLUS": button_list.append("+")
-            elif button == "KEY_MINUS": button_list.append("-")
-            elif button == "KEY_DUP": button_list.append("m-uu")
-            elif button == "KEY_DRIGHT": button_list.append("m-rr")
-            elif button == "KEY_DDOWN": button_list.append("m-dd")
-            elif button == "KEY_DLEFT": button_list.append("m-ll")
-            elif button == "KEY_LSTICK": button_list.append("ls")
-            elif button == "KEY_RSTICK": button_list.append("rs")
-
-        if len(button_list) > max_buttons:
-            max_buttons = len(button_list)
-
-        ls_x, ls_y = int(left_stick[0]), int(left_stick[1])
-        rs_x, rs_y = int(right_stick[0]), int(right_stick[1])
-
-        if ls_x == 0 and ls_y == 0:
-            left_stick = Vector2f.zero()
-        else:
-            left_stick = Vector2f(ls_x, ls_y)
-
-        if rs_x == 0 and rs_y == 0:
-            right_stick = Vector2f.zero()
-        else:
-            right_stick = Vector2f(rs_x, rs_y)
-
-        #accel_left = Vector3f(*map(float, accel_left))
-        #accel_right = Vector3f(*map(float, accel_right))
+def parseLine(line): #frame number, TSV-TAS buttons, left stick and right stick of an nx-TAS line
+    frame_idx, buttons, left_stick, right_stick = line.split()
+    left_stick = left_stick.split(";")
+    right_stick = right_stick.split(";")
+    button_list = [NXTAS_TOKENS[button] for button in buttons.split(";") if button in NXTAS_TOKENS]
+    return int(frame_idx), button_list, (int(left_stick[0]), int(left_stick[1])), (int(right_stick[0]), int(right_stick[1]))
 
-        #gyro_dir_left = Matrix33f(*map(float, gyro_dir_left))
-        #angvel_left = Vector3f(*map(float, angvel_left))
+def maxButtons(lines): #most buttons pressed on one line, which sets the number of button columns of every row
+    return max((len([button for button in line.split()[1].split(";") if button in NXTAS_TOKENS]) for line in lines), default=0)
 
-        #gyro_dir_right = Matrix33f(*map(float, gyro_dir_right))
-        #angvel_right = Vector3f(*map(float, angvel_right))
-
-        #gyro_left = Gyro(gyro_dir_left, angvel_left)
-        #gyro_right = Gyro(gyro_dir_right, angvel_right)
+#yields a frame for each run of lines with the same inputs, and for each gap between frame numbers, once the frame after it has started
+def readFrames(lines):
+    frame_idx_old = -1
+    last = None #frame the current line may still be added to
+    for line in lines:
+        frame_idx, button_list, left_stick, right_stick = parseLine(line)
 
         numSkipped = frame_idx - frame_idx_old - 1
-
-        if numSkipped > 0:           
-            frame = Frame(numSkipped, [], Vector2f.zero(), Vector2f.zero())
-            frames.append(frame)
+        if numSkipped > 0:
+            if last is not None: yield last
+            last = Frame(numSkipped, [], ZERO_STICK, ZERO_STICK)
 
         #check for repeated frames
-        if len(frames) > 0 and frames[-1].buttons == button_list and frames[-1].left_stick == left_stick and frames[-1].right_stick == right_stick:
+        if last is not None and last.buttons == button_list and last.left_stick == left_stick and last.right_stick == right_stick:
+            last.duration += 1
             # Separate D-pad buttons into a new frame if they exist
-            dpad_buttons = [button for button in button_list if button in ["m-ll", "m-uu", "m-rr", "m-dd", "m-d", "m-u", "m-r", "m-l","m"]]
-            dp_buttons = ["m-ll", "m-uu", "m-rr", "m-dd", "m-d", "m-u", "m-r", "m-l","m"]
-            frames[-1].duration += 1
+            dpad_buttons = [button for button in button_list if button in MOTION_TOKENS]
             if dpad_buttons:
-                dpad_frame = Frame(1, dpad_buttons, Vector2f.zero(), Vector2f.zero())
-                frames.append(dpad_frame)
-                button_list = [button for button in button_list if button not in dp_buttons]
-            
+                yield last
+                last = Frame(1, dpad_buttons, ZERO_STICK, ZERO_STICK)
         else:
-            frame = Frame(1, button_list, left_stick, right_stick)
-            frames.append(frame)
+            if last is not None: yield last
+            last = Frame(1, button_list, left_stick, right_stick)
 
         frame_idx_old = frame_idx
-    
+    if last is not None: yield last
+
+#moves the motion buttons of one-frame frames onto the last frame of the frame before them, splitting that frame's last frame off if it is longer
+#only the frame before the current one can still change, so it is the only one held back
+def splitMotion(frames):
+    previous = None
+    for frame in frames:
+        dpad_buttons = [button for button in frame.buttons if button in MOTION_TOKENS]
+        if dpad_buttons and frame.duration == 1 and previous is not None: #the first frame has no frame before it to move its buttons onto
+            frame.buttons = [button for button in frame.buttons if button not in MOTION_TOKENS]
+            if previous.duration > 1:
+                previous.duration -= 1
+                yield previous
+                previous = Frame(1, dpad_buttons + previous.buttons, previous.left_stick, previous.right_stick)
+            else:
+                previous.buttons.extend(dpad_buttons)
+        if previous is not None: yield previous
+        previous = frame
+    if previous is not None: yield previous
+
+def stepToken(frame): #buttons and sticks of a frame as one token, for a step of a loop or sequence
+    return "&".join(token for token in frame.to_array(0)[1:] if token != "")
+
+#a row of duration frames with the inputs held through all of the steps in their own columns and the rest in one loop or sequence of the steps,
+#so that the inputs held throughout are only parsed once
+def groupRow(steps, duration, separator, max_buttons):
+    held = Frame(duration, [button for button in steps[0].buttons if all(button in step.buttons for step in steps)],
+        steps[0].left_stick if all(step.left_stick == steps[0].left_stick for step in steps) else ZERO_STICK,
+        steps[0].right_stick if all(step.right_stick == steps[0].right_stick for step in steps) else ZERO_STICK)
+    changes = [Frame(step.duration, [button for button in step.buttons if button not in held.buttons],
+        step.left_stick if held.left_stick == ZERO_STICK else ZERO_STICK, step.right_stick if held.right_stick == ZERO_STICK else ZERO_STICK) for step in steps]
+    row = held.to_array(max_buttons)
+    row.insert(1 + len(held.buttons), separator.join("[" + str(step.duration) + "]" + stepToken(step) for step in changes))
+    if len(held.buttons) < max_buttons: del row[-3] #take the place of an empty button column
+    return row
+
+#True if the inputs of the steps are not all the same, so that a loop or sequence of them has more than the durations of its steps
+def changesInputs(steps):
+    return any(set(step.buttons) != set(steps[0].buttons) or step.left_stick != steps[0].left_stick or step.right_stick != steps[0].right_stick for step in steps)
+
+def polar(stick): #r in stick units and theta in degrees of a stick
+    return math.hypot(*stick), math.degrees(math.atan2(stick[1], stick[0]))
+
+def turn(theta, next_theta): #degrees from one angle to the next the short way round
+    return (next_theta - theta + 180) % 360 - 180
+
+def formatNumber(value):
+    return format(value, ".10f").rstrip("0").rstrip(".")
+
+#the rows from i on repeating with a period of up to MAX_LOOP_ROWS rows, as one row with a / loop, and the number of rows it covers
+#the period covering the most frames is used, and the last iteration may stop partway through
+def loopRow(window, i, max_buttons):
+    best = None
+    for period in range(1, MAX_LOOP_ROWS + 1):
+        if i + period * MIN_LOOP_REPEATS > len(window): break
+        if not changesInputs(window[i:i + period]): continue #a loop of one row over and over would have only empty steps, so runs of the same inputs are left as they are
+        count = period
+        while i + count < len(window) and window[i + count] == window[i + count - period]: count += 1
+        if count >= period * MIN_LOOP_REPEATS:
+            duration = sum(frame.duration for frame in window[i:i + count])
+            if best is None or duration > best[0]: best = (duration, period, count)
+    if best is None: return None
+    duration, period, count = best
+    return groupRow(window[i:i + period], duration, "/", max_buttons), count
+
+#the one-frame rows from i with the same buttons whose sticks each stay put or move in a straight line in polar coordinates,
+#as one row with -> interpolations, and the number of rows it covers
+def rampRow(window, i, max_buttons):
+    first = window[i]
+    if first.duration != 1: return None
+    sticks = [first.left_stick, first.right_stick]
+    steps = [None, None] #change in r and theta from one frame to the next of each moving stick
+    count = 1
+    while i + count < len(window):
+        frame = window[i + count]
+        if frame.duration != 1 or frame.buttons != first.buttons: break
+        bent = False
+        for side, stick in enumerate((frame.left_stick, frame.right_stick)):
+            if count == 1:
+                if stick != sticks[side]: steps[side] = [polar(stick)[0] - polar(sticks[side])[0], turn(polar(sticks[side])[1], polar(stick)[1])]
+                continue
+            if steps[side] is None:
+                bent = bent or stick != sticks[side]
+                continue
+            r, theta = polar(stick)
+            last_r, last_theta = polar(sticks[side])
+            tolerance = math.degrees(3 / max(r, 1)) #one stick unit of rounding on each frame turns the stick this far at most
+            bent = bent or abs(r - last_r - steps[side][0]) > 3 or abs(turn(last_theta, theta) - steps[side][1]) > tolerance
+        if bent: break
+        if steps == [None, None]: break
+        sticks = [frame.left_stick, frame.right_stick]
+        count += 1
+    if count < MIN_RAMP_FRAMES: return None
+
+    #a sweep that curves partway through may still be straight for its first part
+    while count >= MIN_RAMP_FRAMES:
+        row = first.to_array(max_buttons)
+        row[0] = count
+        for side, prefix in enumerate(("ls", "rs")):
+            if steps[side] is None: continue
+            ends = fitSweep([(frame.left_stick, frame.right_stick)[side] for frame in window[i:i + count]])
+            if ends is None: break
+            row[len(row) - 2 + side] = prefix + "(" + ends[0] + ")->" + prefix + "(" + ends[1] + ")"
+        else:
+            return row, count
+        count //= 2
+    return None
+
+#the stick of each frame of an interpolation between r; theta texts start and end over count frames, as the compiler computes it
+def sweep(start, end, count):
+    r, theta = interpolate(tuple(map(float, start.split(";"))), tuple(map(float, end.split(";"))), count, EASINGS["linear"])
+    return [tuple(int(value * 32767) for value in Joystick.polar(position)[2:]) for position in zip(r, theta)]
+
+#texts of r; theta a stick at (r, theta) in stick units and degrees may have been written as, the roundest first
+def polarTexts(r, theta):
+    r_texts = [formatNumber(round(r / 32767, digits)) for digits in (2, 3, 4)] + [formatNumber((r + RAMP_NUDGE) / 32767)]
+    theta_texts = [formatNumber(round(theta, digits)) for digits in (0, 1, 2)] + [formatNumber(theta)]
+    return list(dict.fromkeys(r_text + "; " + theta_text for r_text in r_texts for theta_text in theta_texts))
+
+#texts of the start and end of an interpolation that moves a stick through the positions, or None if there are none
+def fitSweep(positions):
+    polars = [polar(position) for position in positions]
+    end_theta = polars[0][1] + sum(turn(a[1], b[1]) for a, b in zip(polars, polars[1:])) #the end may be more than a full turn from the start
+    starts = [text for text in polarTexts(*polars[0]) if sweep(text, text, 2)[0] == positions[0]]
+    ends = [text for text in polarTexts(polars[-1][0], end_theta) if sweep(text, text, 2)[0] == positions[-1]]
+    for start in starts:
+        for end in ends:
+            if sweep(start, end, len(positions)) == positions: return start, end
+    return None
+
+#the short rows from i up to the next loop or interpolation that only change buttons, as one row with a | sequence of the buttons, and the number of rows it covers
+#rows changing sticks are left as they are, since long tokens of stick positions that never repeat are slower to compile than rows of them
+def sequenceRow(window, i, max_buttons):
+    first = window[i]
+    count = 0
+    while i + count < len(window) and count < MAX_SEQUENCE_ROWS:
+        frame = window[i + count]
+        if frame.duration > MAX_SEQUENCE_DURATION or frame.left_stick != first.left_stick or frame.right_stick != first.right_stick: break
+        if count > 0 and (loopRow(window, i + count, max_buttons) or rampRow(window, i + count, max_buttons)): break
+        count += 1
+    frames = window[i:i + count]
+    if count < 2 or not changesInputs(frames): return None
+    return groupRow(frames, sum(frame.duration for frame in frames), "|", max_buttons), count
+
+#True if the compressed rows compile to the same LunaKit and nx-TAS scripts as the rows of frames they were compressed from
+def reproduces(rows, max_buttons):
+    compressed = "".join("\t".join(map(str, row)) + "\n" for row, frames in rows)
+    original = "".join("\t".join(map(str, frame.to_array(max_buttons))) + "\n" for row, frames in rows for frame in frames)
+    try:
+        return all(tsvtas.compile(compressed, options) == tsvtas.compile(original, options) for options in VERIFY_OPTIONS)
+    except tsvtas.CompileError:
+        return False
+
+#yields the compressed rows that compile to the same frames as the rows they were compressed from, and the rows of the frames of the others
+#each compressed row covers the same frames as the rows it replaces, so rows can be checked many at a time, halving the rows checked together on a mismatch
+def verified(rows, max_buttons):
+    if not rows: return
+    if reproduces(rows, max_buttons):
+        for row, frames in rows: yield row
+    elif len(rows) == 1:
+        for frame in rows[0][1]: yield frame.to_array(max_buttons)
+    else:
+        yield from verified(rows[:len(rows) // 2], max_buttons)
+        yield from verified(rows[len(rows) // 2:], max_buttons)
+
+#the first row of window[i:] compressed into a loop, interpolation or sequence if one starts there, and the number of rows it covers
+def compressedRow(window, i, max_buttons):
+    for candidate in (loopRow, rampRow, sequenceRow):
+        found = candidate(window, i, max_buttons)
+        if found is not None: return found
+    return window[i].to_array(max_buttons), 1
+
+#compresses the rows of window up to at least row stop, returning the compressed rows with the rows of frames each replaces, and the number of rows covered
+def compressBlock(window, stop, max_buttons):
+    rows = []
     i = 0
-    while i < len(frames):
-        dpad_buttons = [button for button in frames[i].buttons if button in ["m-ll", "m-uu", "m-rr", "m-dd", "m-d", "m-u", "m-r", "m-l", "m"]]
-        dp_buttons = ["m-ll", "m-uu", "m-rr", "m-dd", "m-d", "m-u", "m-r", "m-l", "m"]
-        if dpad_buttons and frames[i].duration == 1:
-            frames[i].buttons = [button for button in frames[i].buttons if button not in dp_buttons]
-            if frames[i - 1].duration > 1:
-                frames[i - 1].duration -= 1
-                frames.insert(i, Frame(1, dpad_buttons + frames[i - 1].buttons, frames[i - 1].left_stick, frames[i - 1].right_stick))
-                i += 1  # Skip the newly inserted frame
+    while i < stop:
+        row, count = compressedRow(window, i, max_buttons)
+        rows.append((row, window[i:i + count]))
+        i += count
+    return rows, i
+
+#yields the rows of the frames, compressed in blocks of COMPRESS_LOOKAHEAD rows while the next COMPRESS_LOOKAHEAD rows are held back to find patterns in
+def compress(frames, max_buttons):
+    window = []
+    for frame in frames:
+        window.append(frame)
+        if len(window) >= 2 * COMPRESS_LOOKAHEAD:
+            rows, count = compressBlock(window, COMPRESS_LOOKAHEAD, max_buttons)
+            del window[:count]
+            yield from verified(rows, max_buttons)
+    rows, count = compressBlock(window, len(window), max_buttons)
+    yield from verified(rows, max_buttons)
+
+def convert(inpath, outpath, compressed=False):
+    with open(inpath) as infile:
+        max_buttons = maxButtons(infile)
+        infile.seek(0)
+        with open(outpath, "w") as outfile:
+            tsv_writer = csv.writer(outfile, delimiter = '\t', lineterminator='\n',)
+            frames = splitMotion(readFrames(infile))
+            if compressed: tsv_writer.writerows(compress(frames, max_buttons))
             else:
-                frames[i - 1].buttons.extend(dpad_buttons)
-        i += 1
-        
-infile.close()
-
-outfile = open(outpath, "w")
-
-tsv_writer = csv.writer(outfile, delimiter = '\t', lineterminator='\n',)
-
-for frame in frames:
-    tsv_writer.writerow(frame.to_array())
+                for frame in frames:
+                    tsv_writer.writerow(frame.to_array(max_buttons))
+
+if __name__ == "__main__":
+    if sys.argv[1][0] == '-':
+        convert(sys.argv[2], sys.argv[3], "c" in sys.argv[1])
+    else:
+        convert(sys.argv[1], sys.argv[2])
@@ -0,0 +1,21 @@
+#the TSV-TAS compiler as an importable package: tsv-tas.py is the command line interface to it
+#the compiler is imported when one of its names is first used, so the compile server's client (tsvtas.client) starts without it
+import importlib
+
+EXPORTS = {
+    "Compiler": "compiler",
+    "CompileOptions": "compiler",
+    "CompileError": "compiler",
+    "CompileCache": "compiler",
+    "compile": "compiler",
+    "compileFile": "compiler",
+    "separatorFor": "compiler",
+    "Script": "frames",
+}
+
+def __getattr__(name):
+    if name not in EXPORTS: raise AttributeError("module " + __name__ + " has no attribute " + name)
+    return getattr(importlib.import_module("." + EXPORTS[name], __name__), name)
+
+def __dir__():
+    return list(globals()) + list(EXPORTS)
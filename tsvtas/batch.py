@@ -0,0 +1,66 @@
+#compiles many scripts at once across a pool of processes
+#usage: python3 -m tsvtas.batch [-n] [-e] [-d] [-o output directory] [-j processes] scripts or directories of scripts...
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from .compiler import CompileOptions, CompileError, compileFile, separatorFor
+
+def findScripts(paths): #the scripts given, with directories replaced by the .tsv and .csv scripts in them (.txt files are skipped since nx-TAS output uses that extension)
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".tsv") or name.endswith(".csv"): scripts.append(os.path.join(path, name))
+        else:
+            scripts.append(path)
+    return scripts
+
+def outputPath(path, output_dir, nxtas): #named like the -p option of tsv-tas.py names outputs
+    outfile = os.path.splitext(path)[0] #compileOne rejects paths without a .tsv or .csv extension before anything is written
+    if nxtas: outfile += ".txt"
+    if output_dir is not None: outfile = os.path.join(output_dir, os.path.basename(outfile))
+    return outfile
+
+def compileOne(path, outpath, options:CompileOptions): #returns None if the script compiled, otherwise the error
+    if separatorFor(path) is None: return "Error: Invalid file type"
+    try:
+        compileFile(path, outpath, options)
+    except (CompileError, OSError) as e:
+        return str(e)
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m tsvtas.batch", description="Compile many TSV-TAS scripts in parallel")
+    parser.add_argument("scripts", nargs="+", help="scripts, or directories whose .tsv and .csv scripts are all compiled")
+    parser.add_argument("-n", action="store_true", help="generate nx-TAS scripts instead of binary scripts")
+    parser.add_argument("-e", action="store_true", help="skip empty frames")
+    parser.add_argument("-d", action="store_true", help="also generate a debug CSV for each script")
+    parser.add_argument("-o", metavar="DIR", help="directory to write the outputs to (by default, next to each script)")
+    parser.add_argument("-j", metavar="N", type=int, default=None, help="number of processes (by default, one per CPU)")
+    args = parser.parse_args(argv)
+
+    options = CompileOptions(nxtas=args.n, remove_empty=args.e, debug=args.d, dump=args.d)
+    scripts = findScripts(args.scripts)
+    if args.o is not None: os.makedirs(args.o, exist_ok=True)
+    jobs = [(path, outputPath(path, args.o, args.n), options) for path in scripts]
+
+    if len(jobs) <= 1 or args.j == 1:
+        errors = [compileOne(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=args.j) as pool:
+            errors = list(pool.map(compileOne, *zip(*jobs)))
+
+    failed = 0
+    for (path, outpath, _), error in zip(jobs, errors):
+        if error is None:
+            print(path + " -> " + outpath)
+        else:
+            print(path + ": " + error)
+            failed += 1
+    print(str(len(jobs) - failed) + " of " + str(len(jobs)) + " scripts successfully generated")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
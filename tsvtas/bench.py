@@ -0,0 +1,141 @@
+#benchmarks the compiler on generated scripts, timing each phase of the compile and writing the results as JSON
+#usage: python3 -m tsvtas.bench [-r rows] [-n repeats] [-s seed] [-o results.json] [-b baseline.json] [--scripts directory] [scenarios...]
+#compare against the results of another version with -b to list the phases that got slower
+import io
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+
+from .compiler import Compiler, CompileOptions, PHASES
+
+#generators of one row of each feature, each given a random number generator
+def holdRow(rng):
+    return str(rng.randint(30, 600)) + "\t" + rng.choice(["a", "b", "zl", "zr", "a&b"]) + "\tls(1; " + str(rng.randint(0, 359)) + ")"
+
+def stickRow(rng): #a new stick position every frame
+    return "1\tls(" + str(round(rng.random(), 2)) + "; " + str(rng.randint(0, 359)) + ")\trs(" + str(round(rng.random(), 2)) + "; " + str(rng.randint(0, 359)) + ")"
+
+def loopRow(rng):
+    return str(rng.randint(10, 120)) + "\t" + rng.choice(["[1]a/[1]", "[2]b/[1]/[3]x", "[1]ls(1; 0)/[1]ls(1; 180)", "[1]zl/[2]"])
+
+def sequenceRow(rng):
+    return str(rng.randint(6, 40)) + "\t" + rng.choice(["([2]a|[3]b|[?]x)", "(a|[2]ls(1; 180)|[?]rs(1; 270))", "([1]zl|[?][1]a/[1])"])
+
+def interpolationRow(rng):
+    return str(rng.randint(5, 60)) + "\tls(1; " + str(rng.randint(0, 359)) + ")->ls(" + str(round(rng.random(), 2)) + "; " + str(rng.randint(0, 359)) + ")"
+
+def expressionRow(rng):
+    return str(rng.randint(4, 30)) + "\t" + rng.choice(["ls(1; !+10)", "rs(!; !-15)", "ls(1; @*7.5)", "rs(@/30; 90)", "ls(1; !+5)\trs(1; @*3)"])
+
+def gyroRow(rng):
+    if rng.random() < 0.3: return str(rng.randint(2, 8)) + "\t" + rng.choice(["m", "m-l", "m-rr", "m-uu", "m-d"])
+    return "1\tlg(" + str(rng.randint(-90, 90)) + "; " + str(rng.randint(-90, 90)) + "; " + str(rng.randint(-90, 90)) + ")\tra(" + str(round(rng.uniform(-1, 1), 2)) + "; 0; 1)"
+
+def toggleRow(rng):
+    return str(rng.randint(1, 30)) + "\t" + rng.choice(["[*]zr", "[0]zr", "[*]x", "[0]x", "[*]a&b"])
+
+def twoPlayerRow(rng):
+    return str(rng.randint(1, 30)) + "\t" + rng.choice(["a\tca", "cb\tcls(0.5; 180)", "c[*]y", "crs(1; 45)\tcm", "[0]cy\t[0]x"])
+
+FEATURES = {
+    "holds": holdRow,
+    "sticks": stickRow,
+    "loops": loopRow,
+    "sequences": sequenceRow,
+    "interpolation": interpolationRow,
+    "expressions": expressionRow,
+    "gyro": gyroRow,
+    "toggles": toggleRow,
+    "2p": twoPlayerRow,
+}
+
+#each scenario is a mix of features, weighted by how many of its rows have each feature
+SCENARIOS = {name: {name: 1} for name in FEATURES}
+SCENARIOS["mixed"] = {"holds": 4, "sticks": 8, "loops": 1, "sequences": 1, "interpolation": 2, "expressions": 2, "gyro": 2, "toggles": 1, "2p": 1}
+
+FORMATS = { #output formats every scenario is compiled to
+    "binary": CompileOptions(),
+    "binary -e": CompileOptions(remove_empty=True),
+    "nx-TAS": CompileOptions(nxtas=True),
+}
+
+def generateScript(mix, rows, seed=0): #the lines of a script of rows rows, with features picked at random by the weights in mix
+    rng = random.Random(seed)
+    features = [FEATURES[name] for name in mix]
+    weights = list(mix.values())
+    lines = ["$is2p = t"] if "2p" in mix else []
+    for feature in rng.choices(features, weights, k=rows):
+        lines.append(feature(rng))
+    return lines
+
+def timeCompile(lines, options:CompileOptions, repeats): #the fastest time of each phase and of the whole compile over repeats compiles
+    best = dict.fromkeys(PHASES + ("total",), float("inf"))
+    for _ in range(repeats):
+        compiler = Compiler(options)
+        outf = io.StringIO() if options.nxtas else io.BytesIO()
+        start = time.perf_counter()
+        script = compiler.compile(lines, outf)
+        total = time.perf_counter() - start
+        for phase, seconds in list(compiler.phaseSeconds.items()) + [("total", total)]:
+            best[phase] = min(best[phase], seconds)
+    return best, script.frames_P1.length, outf.tell()
+
+def runBenchmarks(scenarios, rows, repeats, seed, scripts_dir=None):
+    results = []
+    for name in scenarios:
+        lines = generateScript(SCENARIOS[name], rows, seed)
+        if scripts_dir is not None:
+            with open(scripts_dir + "/" + name + ".tsv", "w") as f:
+                f.write("\n".join(lines) + "\n")
+        for format_name, options in FORMATS.items():
+            seconds, frames, size = timeCompile(lines, options, repeats)
+            results.append({"scenario": name, "format": format_name, "rows": rows, "frames": frames, "output_bytes": size, "seconds": seconds})
+            print("%-14s %-10s %8d frames %9.4f s" % (name, format_name, frames, seconds["total"]), file=sys.stderr)
+    return results
+
+def compareResults(results, baseline, threshold): #prints the phases that are slower than in baseline by more than threshold times, returning how many there are
+    previous = {(result["scenario"], result["format"], result["rows"]): result["seconds"] for result in baseline["results"]}
+    slower = 0
+    for result in results:
+        old = previous.get((result["scenario"], result["format"], result["rows"]))
+        if old is None: continue
+        for phase, seconds in result["seconds"].items():
+            if phase in old and old[phase] >= 0.001 and seconds > old[phase] * threshold: #ignore phases too short to time reliably
+                print("Slower: %s, %s, %s: %.4f s -> %.4f s (%.2fx)" % (result["scenario"], result["format"], phase, old[phase], seconds, seconds / old[phase]))
+                slower += 1
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python3 -m tsvtas.bench", description="Time each phase of the compiler on generated scripts")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help="scenarios to run (by default, all of them): " + ", ".join(SCENARIOS))
+    parser.add_argument("-r", "--rows", type=int, default=2000, help="rows in each generated script")
+    parser.add_argument("-n", "--repeats", type=int, default=3, help="compiles of each script, of which the fastest time of each phase is kept")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the generated scripts")
+    parser.add_argument("-o", "--output", help="file to write the results to as JSON (by default, standard output)")
+    parser.add_argument("-b", "--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=1.25, help="how many times slower than the baseline a phase must be to be reported")
+    parser.add_argument("--scripts", metavar="DIR", help="directory to also save the generated scripts to")
+    args = parser.parse_args(argv)
+    for name in args.scenarios:
+        if name not in SCENARIOS: parser.error("unknown scenario " + name)
+
+    results = runBenchmarks(args.scenarios, args.rows, args.repeats, args.seed, args.scripts)
+    document = {"python": platform.python_version(), "platform": platform.platform(), "seed": args.seed, "repeats": args.repeats, "results": results}
+    if args.output is None:
+        json.dump(document, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        return 1 if compareResults(results, baseline, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
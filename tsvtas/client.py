@@ -0,0 +1,50 @@
+#thin client for the compile server in server.py: it only imports the socket module, so asking the server to compile a script starts quickly
+#a request is one line of tab separated option letters, input path and output path, and the server answers with a line of "ok" or "error"
+#and the seconds the compile took, followed by the message until the connection is closed
+import os
+import socket
+import tempfile
+
+DEFAULT_PORT = 7979 #used where there are no Unix sockets
+SOCKET_NAME = "compile.sock"
+
+def parseAddress(address): #a port number, host:port, or the path of a Unix socket
+    if "/" in address or os.sep in address: return address
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+def serverAddress(): #the address in the TSVTAS_SERVER environment variable, or the default address
+    address = os.environ.get("TSVTAS_SERVER")
+    if address is None: return defaultAddress()
+    return parseAddress(address)
+
+#a Unix socket in a directory only this user can open, so other users on the computer cannot send the server scripts to compile,
+#or the local port where there are no Unix sockets
+def defaultAddress():
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "getuid"): return ("127.0.0.1", DEFAULT_PORT)
+    return os.path.join(socketDirectory(), SOCKET_NAME)
+
+def socketDirectory():
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime: return os.path.join(runtime, "tsvtas")
+    return os.path.join(tempfile.gettempdir(), "tsvtas-" + str(os.getuid()))
+
+def formatAddress(address):
+    return address if isinstance(address, str) else address[0] + ":" + str(address[1])
+
+def compileRemote(flags, infile, outfile, address=None): #returns whether the script compiled, the server's message and the seconds the compile took
+    if address is None: address = serverAddress()
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        request = "\t".join([flags, os.path.abspath(infile), os.path.abspath(outfile)]) + "\n"
+        connection.sendall(request.encode())
+        connection.shutdown(socket.SHUT_WR)
+        response = b""
+        while True:
+            data = connection.recv(65536)
+            if not data: break
+            response += data
+    status, _, message = response.decode().partition("\n")
+    result, seconds = status.split("\t")
+    return result == "ok", message, float(seconds)
@@ -0,0 +1,765 @@
+import re
+import math
+import io
+import os
+import time
+import functools
+import contextlib
+import dataclasses
+from dataclasses import dataclass
+
+from .expressions import evaluateMath, evaluateLast, evaluateCurrentFrame, compileStickExpression, isPlainNumber
+from .frames import Vector3f, Joystick, Matrix33f, Gyro, Script, to_f2, toBounds, zeroSigns, calculateAngularVelocity, nonEmptyRanges, resolveToggles
+from .writers import ScriptWriter, CSVDump, NPYDump, DEBUG_CHANNELS
+from .vocabulary import BUTTON_BITS, MOTION_MACROS, NXTAS_MOTION_BUTTONS
+
+STREAM_CHUNK_FRAMES = 65536 #most frames expanded and written out at once
+STREAM_LOOKBACK_FRAMES = 600 #frames kept when streaming behind the furthest back any row has written so far, in case a later row writes further back
+PHASES = ("parse", "toggles", "angular velocity", "expand", "skip empty", "write") #phases of a compile, timed in Compiler.phaseSeconds
+
+class CompileError(Exception): #an error in a script, whose message is shown to the user
+    pass
+
+@dataclass
+class CompileOptions:
+    nxtas: bool = False #generate an nx-TAS script instead of a LunaKit binary script
+    remove_empty: bool = False #skip frames with no inputs
+    debug: bool = False #print how each row is parsed
+    stream: bool = False #write frames out while the script is still being read
+    separator: str = "\t" #separator between the columns of a row
+    dump: bool = False #write the debug dump of every frame with compileFile
+    debug_first: int = None #first frame number in the debug dump, or None to start at the first frame
+    debug_stop: int = None #frame number the debug dump stops before, or None to go to the last frame
+    debug_channels: tuple = tuple(DEBUG_CHANNELS) #channels in the debug dump (see writers.DEBUG_CHANNELS)
+    debug_format: str = "csv" #"csv" for a CSV file, or "npy" for a directory of one .npy array per channel
+
+@dataclass
+class RowResult:
+    writes: list #every write made while parsing the row, as logged by FrameTable.record
+    reads_frames: bool #True if the row uses ! and so depends on the frames written before it
+
+
+#state kept between compiles in loop mode so that unchanged rows are replayed instead of parsed again
+#(toggles and angular velocities are resolved over the runs of each timeline, so they are cheap to redo in full)
+class CompileCache:
+    def __init__(self):
+        self.rows = {} #row key -> RowResult
+        self.order = [] #keys of the rows with inputs, in the order they were compiled
+
+    def startCompile(self):
+        self.used = set()
+        self.newOrder = []
+        self.unchanged = True #True while every row so far matches the previous compile
+
+    #returns the result of the row to replay, or None if the row must be parsed
+    def getRow(self, key):
+        position = len(self.newOrder)
+        self.newOrder.append(key)
+        if position >= len(self.order) or self.order[position] != key: self.unchanged = False
+        row = self.rows.get(key)
+        if row is None or (row.reads_frames and not self.unchanged): return None
+        self.used.add(key)
+        return row
+
+    def addRow(self, key, row:RowResult):
+        self.unchanged = False
+        self.rows[key] = row
+        self.used.add(key)
+
+    def finishRows(self): #forgets the rows that were not in this compile
+        for key in list(self.rows):
+            if key not in self.used: del self.rows[key]
+        self.order = self.newOrder
+
+
+def getButtonBin(button):
+    button = button.lower().strip()
+    if len(button) > 1 and button[0] == "c": button = button[1:] #2P button
+    return BUTTON_BITS.get(button, 0) #0 if no button found
+
+VARIABLE_REGEX = re.compile("(\\$\\w+|#)") #a $ variable or the # row duration
+
+@functools.lru_cache(maxsize=65536)
+def splitVariables(token): #splits a token into literal text and the $ or # references between it, once per distinct token
+    parts = tuple(VARIABLE_REGEX.split(token))
+    names = tuple(part[1:].lower() for part in parts[1::2] if part != '#')
+    return parts, names, '#' in parts[1::2]
+
+@functools.lru_cache(maxsize=65536)
+def expandToken(parts, values, row_duration, first_column): #keyed on the values of the referenced variables only, so defining other variables keeps the result cached
+    return evaluateMath(evaluateVariables(parts, values, row_duration), first_column)
+
+def evaluateVariables(parts, values, row_duration): #evaluates all variables of form $ or #
+    pieces = list(parts)
+    values = iter(values)
+    for i in range(1, len(pieces), 2):
+        pieces[i] = str(row_duration) if pieces[i] == '#' else next(values)
+
+    return ''.join(pieces).lower()
+
+#parses the duration of a token
+def parseDuration(token, default):
+    try:
+        duration_str = token[token.index('[') + 1 : token.index(']')].strip()
+        if duration_str == '?' or duration_str == '*': #special duration characters
+            duration = duration_str
+        else:
+            try: duration = int(float(duration_str)) #rounds down floats
+            except: raise CompileError("Error: Invalid local duration")
+        token = token.replace(token[token.index('[') : token.index(']') + 1], '')
+        return token.strip(), duration
+    except:
+        return token, default
+
+#prev_stick is used to evaluate ! characters if it is not None
+#offset_from_row_index is used to evaluate @ characters if it is not None
+def getStickPolar(token, prev_stick, offset_from_row_index):
+    r = 1.0
+    theta = 0.0
+    if ';' in token: #(r; theta)
+        r_token = token[0:token.index(';')]
+        theta_token = token[token.index(';') + 1:]
+        if prev_stick is not None: r_token, theta_token = evaluateLast(r_token, prev_stick.r), evaluateLast(theta_token, prev_stick.theta)
+        if offset_from_row_index is not None: r_token, theta_token = evaluateCurrentFrame(r_token, offset_from_row_index), evaluateCurrentFrame(theta_token, offset_from_row_index)
+        r, theta = float(r_token), float(theta_token)
+    else:# (r)
+        if prev_stick is not None: token = evaluateLast(token, prev_stick.theta)
+        if offset_from_row_index is not None: token = evaluateCurrentFrame(token, offset_from_row_index)
+        theta = float(token)
+    return r, theta
+
+#functions of the coordinate on the previous frame and the frames since the start of the row giving the r and theta of a stick token with ! or @,
+#or None if the token can only be evaluated by getStickPolar
+def compileStickPolar(token):
+    if ';' in token: #(r; theta)
+        r = compileStickExpression(token[0:token.index(';')])
+        theta = compileStickExpression(token[token.index(';') + 1:])
+    else:# (r)
+        r = lambda last, offset: 1.0
+        theta = compileStickExpression(token)
+    if r is None or theta is None: return None
+    return r, theta
+
+#euler in degrees to rotation matrix
+def toRotationMatrix(euler:Vector3f):
+    return rotationMatrix(euler.x, euler.y, euler.z)
+
+#euler angles in degrees to their rotation matrix, which is the same Matrix33f for the same angles
+def rotationMatrix(x, y, z):
+    return eulerRotation(x, y, z, zeroSigns((x, y, z)))
+
+@functools.lru_cache(maxsize=65536, typed=True) #gyro angles repeat across rows and within interpolations
+def eulerRotation(x, y, z, zero_signs):
+    x, y, z = math.radians(x), math.radians(y), math.radians(z)
+
+    cx = math.cos(x)
+    cy = math.cos(y)
+    cz = math.cos(z)
+    sx = math.sin(x)
+    sy = math.sin(y)
+    sz = math.sin(z)
+
+    return Matrix33f(to_f2(cy * cz), to_f2(-cy * sz), to_f2(sy),
+                     to_f2(cz * sx * sy + cx * sz), to_f2(cx * cz - sx * sy * sz), to_f2(-cy * sx),
+                     to_f2(-cx * cz * sy + sx * sz), to_f2(cz * sx + cx * sy * sz), to_f2(cx * cy))
+
+def getGyroValues(token):
+    all = token.split(";") #(pitch; yaw; roll) or #(pitch; yaw; roll; ang-x; ang-y; ang-z)
+    ang_vel = Vector3f.zero()
+    euler = Vector3f.zero()
+    if len(all) == 6:
+        ang_vel.x, ang_vel.y, ang_vel.z = to_f2(float(all[3])), to_f2(float(all[4])), to_f2(float(all[5]))
+    euler.x, euler.y, euler.z = float(all[0]), float(all[1]), float(all[2])
+    
+    return Gyro(euler, toRotationMatrix(euler), ang_vel)
+
+EASINGS = { #easing curves for interpolations, from the fraction of the interpolation's frames passed to the fraction of the way to the end value
+    "linear": lambda t: t,
+    "ease-in": lambda t: t * t,
+    "ease-out": lambda t: t * (2 - t),
+    "ease-in-out": lambda t: t * t * (3 - 2 * t),
+}
+
+#values of each component going from start to end over duration frames along easing, as one list per component ending exactly on end
+#each frame is computed from its own fraction of the way through, so rounding errors do not add up over long interpolations
+def interpolate(start, end, duration, easing):
+    fractions = [easing(k / (duration - 1)) for k in range(duration)]
+    ramps = [[a + (b - a) * fraction for fraction in fractions] for a, b in zip(start, end)]
+    for ramp, b in zip(ramps, end): ramp[-1] = b
+    return ramps
+
+#values of the components of a ;-separated accelerometer or gyro token, with ! taking the value of the same component on the previous frame
+def parseComponents(token, previous):
+    return [float(evaluateLast(part, prev) if '!' in part else part) for part, prev in zip(token.split(";"), previous)]
+
+#last frame written by a range, or 0 if it is empty or entirely before frame 0
+def lastFrame(frameRange:range):
+    if len(frameRange) == 0: return 0
+    return max(0, frameRange[0], frameRange[-1])
+
+def readRows(lines, separator, debug): #yields the tokens of each line of the script
+    for lineIn in lines:
+        if debug: print(lineIn)
+        lineIn = lineIn.split(separator)
+        lineIn[-1] = lineIn[-1].strip()
+        yield lineIn
+
+
+#compiles scripts with the given options, keeping all the state of a compile on the instance so that compilers are independent
+#if cache is a CompileCache, rows that have not changed since the previous compile with this compiler are replayed instead of parsed
+class Compiler:
+    def __init__(self, options:CompileOptions=None, cache=None):
+        self.options = options if options is not None else CompileOptions()
+        self.cache = cache
+        self.phaseSeconds = dict.fromkeys(PHASES, 0.0) #seconds the last compile spent in each phase, with parse being everything outside the others
+        self.profile = None #a profiling.Profile to fill in during compiles
+
+    #compiles the rows of a script read from lines (any iterable of strings, such as an open file) into outf,
+    #which must be a text file for nx-TAS output and a seekable binary file otherwise, and writes the debug dump to debugDump (a CSVDump or NPYDump) if it is given
+    #returns the compiled Script, whose frames have been written out
+    def compile(self, lines, outf, debugDump=None):
+        profile = self.profile
+        if profile is not None: profile.start()
+        self.phaseSeconds = dict.fromkeys(PHASES, 0.0)
+        self.phaseClock = time.perf_counter() #start of the current stretch of parsing
+        self.script = Script("", "", 1, False, Vector3f.zero())
+        writer = ScriptWriter(self.script, self.options.nxtas, outf, debugDump)
+        self.independent_gyro = False
+        self.motion_offset = 0
+        if self.cache is not None: self.cache.startCompile()
+
+        self.lineInNumber = 1
+
+        indexStart = 0
+        reach = 0 #furthest back from the start of its row that a row has written, which later rows are assumed not to exceed when streaming
+
+        self.vars = dict()
+        vars_version = 0 #changes whenever a variable is assigned
+        rowsAtStart = dict() #number of rows seen so far starting at each frame
+
+        prevLineInDuration = 1
+        for lineIn in readRows(lines, self.options.separator, self.options.debug):
+            if profile is not None: rowStart = time.perf_counter()
+            #handle first token (duration or variable assignment)
+            lineInDuration = 1
+            first = lineIn[0].strip()
+            try: lineInDuration = int(float(first))
+            except:
+                if first == '*': #toggle on the buttons
+                    lineInDuration = '*'
+                elif first == '?':
+                    raise CompileError("Error: ? duration only allowed within sequences")
+                elif first == '':
+                    pass
+                elif first[0] == '$': #variables
+                    if '=' in first: #variable assignment
+                        var = first[1:first.index('=')].strip().lower()
+                        value = first[first.index('=') + 1:].strip()
+
+                        #script start variables
+                        if var == 'stage':
+                            self.script.change_stage_name = value
+                        elif var == 'entr' or var == 'entrance':
+                            self.script.change_stage_id = value
+                        elif var == 'scen' or var == 'scenario':
+                            try: self.script.scenario_no = int(value)
+                            except:
+                                raise CompileError("Error: Invalid scenario number")
+                        elif var == 'independent_gyro' or var == 'ind_gyro':
+                            if self.script.frames_P1.first > 0: self.streamed(var)
+                            if value.lower() == 'true' or value.lower() == 't':
+                                self.independent_gyro = True
+                        elif var == 'pos' or var == 'position':
+                            value = value[value.index('(') + 1:value.index(')')]
+                            coords = value.split(';')
+                            self.script.startPosition.x = float(coords[0])
+                            self.script.startPosition.y = float(coords[1])
+                            self.script.startPosition.z = float(coords[2])
+                        elif var == 'motion_offset':
+                            self.motion_offset = int(value)
+                        elif var == 'is2p' or var == 'is_two_player':
+                            if self.script.frames_P1.first > 0: self.streamed(var)
+                            if value.lower() == 'true' or value.lower() == 't':
+                                self.script.is_two_player = True
+
+                        #other variables
+                        else:
+                            value = self.prepareToken(value, True, 0)
+                            self.vars.update({var: value})
+                            vars_version = hash((vars_version, var, value))
+                        self.lineInNumber += 1
+                        continue
+                    else:
+                        try:
+                            lineInDuration = int(float(evaluateLast(self.prepareToken(first, True, 0), prevLineInDuration)))
+                        except:
+                            self.lineInNumber += 1
+                            continue
+                else:
+                    try:
+                        lineInDuration = int(float(evaluateLast(self.prepareToken(first, True, 0), prevLineInDuration)))
+                    except:
+                        self.lineInNumber += 1
+                        continue
+
+            if any(lineIn[1:]):
+                row = None
+                if self.cache is not None:
+                    rowsAtStart[indexStart] = rowsAtStart.get(indexStart, 0) + 1
+                    key = (tuple(lineIn), indexStart, rowsAtStart[indexStart], vars_version, self.motion_offset, self.script.is_two_player, prevLineInDuration)
+                    row = self.cache.getRow(key)
+                self.script.frames_P1.lowest = self.script.frames_P2.lowest = None
+                if row is not None:
+                    self.script.replay(row.writes)
+                else:
+                    if self.cache is not None: self.script.setLog([])
+                    reads_frames = False
+                    for i in range(1, len(lineIn)):
+                        if lineIn[i] == '':
+                            continue
+
+                        #perform all variable evaluation and as much math evaluation as possible
+                        token = self.prepareToken(lineIn[i], False, lineInDuration)
+                        if profile is not None: profile.counters["tokens"] += 1
+                        reads_frames = reads_frames or '!' in token
+
+                        if self.options.debug: print("Line Duration: " + str(lineInDuration))
+                        self.parseToken(token, indexStart, lineInDuration, indexStart, lineInDuration)
+                    if self.cache is not None:
+                        self.cache.addRow(key, RowResult(self.script.frames_P1.log, reads_frames))
+                        self.script.setLog(None)
+                for frames in (self.script.frames_P1, self.script.frames_P2):
+                    if frames.lowest is None: continue
+                    if frames.lowest < frames.first:
+                        raise CompileError("Error: Line " + str(self.lineInNumber) + " changes frame " + str(frames.lowest) + ", which was already written out while streaming (run without -s)")
+                    reach = max(reach, indexStart - frames.lowest)
+                if profile is not None: profile.addLine(self.lineInNumber, lineIn, time.perf_counter() - rowStart)
+
+            if lineInDuration == '*': lineInDuration = 0
+            indexStart += lineInDuration
+            self.lineInNumber += 1
+            prevLineInDuration = lineInDuration
+
+            #write out the frames that later rows can no longer change
+            if self.options.stream:
+                end = min(indexStart, self.script.frames_P1.length) - reach - max(0, -self.motion_offset) - STREAM_LOOKBACK_FRAMES
+                if end - self.script.frames_P1.first >= STREAM_CHUNK_FRAMES: self.flushFrames(writer, end - (end - self.script.frames_P1.first) % STREAM_CHUNK_FRAMES)
+
+        # add empty frames to end of script as needed to reach the total number of frames
+        self.script.addFrames(indexStart)
+        # both players always have the same number of frames
+        self.script.addFrames(self.script.frames_P1.length)
+
+        if self.cache is not None: self.cache.finishRows()
+
+        self.flushFrames(writer, self.script.frames_P1.length)
+        clock = self.timePhase("parse", self.phaseClock)
+        writer.finish()
+        self.timePhase("write", clock)
+        if profile is not None: profile.finish(self)
+        return self.script
+
+    def prepareToken(self, token, first_column, row_duration):
+        if token[:2] == "//" or token[:2] == "\"//": #ignore comment
+            return ""
+        parts, names, uses_duration = splitVariables(token)
+        values = tuple(map(self.vars.get, names))
+        if None in values:
+            missing = [part for part in parts[1::2] if part != '#'][values.index(None)]
+            raise CompileError("Error: Variable " + missing + " not found")
+        return expandToken(parts, values, row_duration if uses_duration else 0, first_column)
+
+    #parses token into subtokens
+    def parseToken(self, token, indexWrite, duration, rowIndex, rowDuration):
+        if self.profile is not None: self.profile.counters["parseToken calls"] += 1
+        if self.options.debug:
+            print("Parsing Token: " + token)
+            print("Write Index: " + str(indexWrite))
+
+        token = token.strip()
+        if re.search("^\\[[0-9]*\\] *\\(", token) or (not "|" in token and not "/" in token):
+            token, duration = parseDuration(token, duration) #see if there is a duration associated with the token
+
+        if self.options.debug: print("Duration: " + str(duration))
+
+        if len(token) > 0 and token[0] == '(' and token[-1] == ')': token = token[1 : -1] #remove enclosing parentheses
+
+        if "|" in token: self.parseSequence(token, indexWrite, rowIndex, rowDuration)
+        elif "/" in token: self.parseLoop(token, indexWrite, duration, rowIndex, rowDuration)
+        elif "&" in token:
+            for subtoken in token.split('&'): self.parseToken(subtoken, indexWrite, duration, rowIndex, rowDuration)
+        elif "->" in token: self.parseInterpolation(token, indexWrite, duration)
+        else:
+            if duration == "?": raise CompileError("Error: ? duration only allowed within sequences")
+            elif duration == "*": self.addToggle(token, indexWrite, True)
+            elif duration == 0: self.addToggle(token, indexWrite, False)
+            elif duration > 0: self.addToFrameRange(token, range(indexWrite, indexWrite + duration), rowIndex)
+            else: self.addToFrameRange(token, range(indexWrite - 1, indexWrite + duration - 1, -1), rowIndex)
+
+    #interpolates a stick, accelerometer or gyro from one value to another over the duration, with an optional easing curve after the end value
+    def parseInterpolation(self, token, indexStart, duration):
+        if '@' in token: raise CompileError("Error: Interpolation on line " + str(self.lineInNumber) + " cannot use @ symbol")
+        if duration < 0: raise CompileError("Error: Interpolation on line " + str(self.lineInNumber) + " cannot have negative duration")
+        if duration < 2: raise CompileError("Error: Interpolation on line " + str(self.lineInNumber) + " must have duration of at least 2")
+
+        player_two = 'c' in token
+
+        #add frames as necessary
+        self.script.addFrames(indexStart + duration)
+
+        frames = self.script.getFrames(player_two)
+
+        try:
+            token1, token2 = token.split("->")
+            easing = EASINGS[token2[token2.rindex(')') + 1:].strip() or "linear"]
+
+            prefix = token1[0:token1.index('(')]
+            right = "r" in prefix #True if right stick/gyro/etc., False if left
+
+            token1 = token1[token1.index('(') + 1:token1.index(')')]
+            token2 = token2[token2.index('(') + 1:token2.index(')')]
+
+            if "s" in prefix: #stick
+                if indexStart - 1 < 0: prev_stick = Joystick.zero()
+                else: prev_stick = frames.getStick(right, indexStart - 1)
+
+                r, theta = interpolate(getStickPolar(token1, prev_stick, None), getStickPolar(token2, prev_stick, None), duration, easing)
+                radians = list(map(math.radians, theta))
+                x = [int(32767 * a * math.cos(b)) / 32767.0 for a, b in zip(r, radians)]
+                y = [int(32767 * a * math.sin(b)) / 32767.0 for a, b in zip(r, radians)]
+                frames.setSticks(right, indexStart, list(zip(r, theta, x, y)))
+
+            elif "a" in prefix: #accelerometer
+                if indexStart - 1 < 0: prev_accel = Vector3f.default_accel()
+                else: prev_accel = frames.getAccel(right, indexStart - 1)
+                previous = (prev_accel.x, prev_accel.y, prev_accel.z)
+
+                start, end = parseComponents(token1, previous), parseComponents(token2, previous)
+                if len(start) != 3 or len(end) != 3: raise ValueError("accelerometer needs 3 values")
+                frames.setAccels(right, indexStart, list(zip(*([to_f2(value) for value in ramp] for ramp in interpolate(start, end, duration, easing)))))
+
+            elif "g" in prefix: #gyroscope, whose angular velocity is interpolated too if either end gives it
+                if indexStart - 1 < 0: prev_gyro = Gyro.zero()
+                else: prev_gyro = frames.getGyro(right, indexStart - 1)
+                previous = (prev_gyro.euler.x, prev_gyro.euler.y, prev_gyro.euler.z, prev_gyro.ang_vel.x, prev_gyro.ang_vel.y, prev_gyro.ang_vel.z)
+
+                start, end = parseComponents(token1, previous), parseComponents(token2, previous)
+                if len(start) not in (3, 6) or len(end) not in (3, 6): raise ValueError("gyro needs 3 or 6 values")
+                x, y, z, *ang_vel = interpolate((start + [0.0] * 3)[:6], (end + [0.0] * 3)[:6], duration, easing)
+                gyros = [(a, b, c) + rotationMatrix(a, b, c) for a, b, c in zip(x, y, z)]
+                frames.setGyros(right, indexStart, gyros, list(zip(*([to_f2(value) for value in ramp] for ramp in ang_vel))))
+
+            else:
+                raise ValueError("only sticks, accelerometers and gyros can be interpolated")
+        except Exception as e:
+            if self.options.debug: print(e)
+            raise CompileError("Error: Syntax error(s) on line " + str(self.lineInNumber) + " prevented script generation")
+
+    def parseSequence(self, token, indexWrite, rowIndex, rowDuration):
+        steps = token.split('|')
+        for i in range(len(steps)):
+            subtoken, duration = parseDuration(steps[i], 1) #parse out duration
+            if duration == '*':
+                raise CompileError("Error: * not supported for durations within sequences (line " + str(self.lineInNumber) + ")")
+            elif duration == '?':
+                duration = rowDuration + rowIndex - indexWrite
+                if duration < 0: duration = 0
+            self.parseToken(subtoken, indexWrite, duration, rowIndex, rowDuration)
+            indexWrite += duration
+
+    #the steps of the first iteration are parsed once, and if every later iteration would make the same writes shifted by the loop's period,
+    #those writes are tiled over the rest of the loop instead of parsing each step again in every iteration
+    def parseLoop(self, token, indexWrite, duration, rowIndex, rowDuration):
+        if duration == '*' or duration == '?': raise CompileError(duration + " not supported for durations within sequences (line " + str(self.lineInNumber) + ")")
+        elif duration == 0: return
+        elif duration < 0: raise CompileError("Error: Loop on line " + str(self.lineInNumber) + " cannot have negative total duration")
+
+        remainingDuration = duration
+        steps = token.split('/')
+        subtokens = []
+        durations = []
+        for i in range(len(steps)):
+            subtoken, duration = parseDuration(steps[i], 1) #parse out duration
+            subtokens.append(subtoken)
+            durations.append(duration)
+        if all(type(duration) is int and duration > 0 for duration in durations) and sum(durations) < remainingDuration:
+            period = sum(durations)
+            body = self.parseLoopBody(subtokens, durations, indexWrite, rowIndex, rowDuration)
+            if body is not None:
+                self.script.tile(indexWrite + period, indexWrite + remainingDuration, period, body)
+                return
+            indexWrite += period
+            remainingDuration -= period
+        while remainingDuration > 0:
+            for i in range(len(steps)):
+                if remainingDuration <= 0: return
+                if durations[i] >= 0:
+                    self.parseToken(subtokens[i], indexWrite, min(durations[i], remainingDuration), rowIndex, rowDuration)
+                    remainingDuration -= durations[i]
+                else:
+                    raise CompileError("Error: Negative durations are not permitted within loops")
+                indexWrite += durations[i]
+
+    #parses one whole iteration of a loop starting at frame indexWrite, returning the writes it logged if they can be repeated by Script.tile, or None otherwise
+    #the writes can only be repeated if each step only writes its own frames, in the same way wherever it starts
+    def parseLoopBody(self, subtokens, durations, indexWrite, rowIndex, rowDuration):
+        log = self.script.frames_P1.log
+        body = []
+        try:
+            for subtoken, duration in zip(subtokens, durations):
+                self.script.setLog([])
+                self.parseToken(subtoken, indexWrite, duration, rowIndex, rowDuration)
+                writes = self.script.frames_P1.log
+                if log is not None: log.extend(writes)
+                if body is not None and self.repeatable(subtoken, writes, indexWrite, indexWrite + duration): body.extend(writes)
+                else: body = None
+                indexWrite += duration
+        finally:
+            self.script.setLog(log)
+        return body
+
+    #True if the writes made by parsing a loop step over frames lo through hi - 1 would be the same shifted for the step starting on any later frame
+    def repeatable(self, token, writes, lo, hi):
+        if any(symbol in token for symbol in ("!", "@", "->", "|", "/")): return False #these read other frames or depend on where the row starts
+        if self.motion_offset != 0 and "m" in token: return False #motion macros shifted before frame 0 are cut off
+        extended = False
+        for player_two, name, args in writes:
+            if name == "extend":
+                if args[0] > hi: return False
+                extended = extended or args[0] == hi
+                continue
+            changes = self.script.getFrames(player_two).changes(name, args)
+            if changes is None: return False
+            for timeline, frameRange, function in changes:
+                start, stop = toBounds(frameRange)
+                if start < stop and (start < lo or stop > hi): return False
+        return extended
+
+    def addToFrameRange(self, token, frameRange:range, rowIndex):
+        #first find the last frame involved, add any additional frames as needed
+        self.script.addFrames(lastFrame(frameRange) + 1)
+
+        if frameRange.start < 0 or frameRange.stop < -1:
+            raise CompileError("Error: Negative durations cannot go before frame 0") 
+
+        player_two = False
+        token = token.strip()
+        if len(token) > 0 and token[0] == "c":
+            player_two = True
+            token = token[1:] #get rid of the c
+        frames = self.script.getFrames(player_two)
+
+        try:
+            button_bin = BUTTON_BITS.get(token)
+            if button_bin is not None: #most tokens are plain buttons, which are looked up before trying anything else
+                frames.orButtons(frameRange, button_bin)
+            elif "(" in token: #stick/motion
+                right = True #True if right stick/gyro/etc.
+                left = True #True if left stick/gyro/etc.
+                if "r" in token:
+                    left = False
+                if "l" in token:
+                    right = False
+                prefix = token[0:token.index('(')]
+                token = token[token.index('(') + 1:token.rfind(')')]  
+
+                if "s" in prefix: #stick
+                    previous_input_symbol = '!' in token
+                    current_symbol = '@' in token
+                    if "x" in prefix:
+                        coords = Joystick.cartesian(int(token.split(";")[0])/32767, int(token.split(";")[1])/32767)
+                        if right: frames.setStick(True, frameRange, coords)
+                        if left: frames.setStick(False, frameRange, coords)
+                    elif previous_input_symbol or current_symbol: #need to calculate each frame individually
+                        functions = compileStickPolar(token)
+                        if functions is not None and (left or right) and (frameRange.step > 0 or not previous_input_symbol):
+                            self.setStickExpression(frames, token, functions, frameRange, rowIndex, left, right, previous_input_symbol)
+                            return
+                        for j in frameRange:
+                            if previous_input_symbol:
+                                if j - 1 < 0: prev_stick = Joystick.zero()
+                                else: prev_stick = frames.getStick(right, j - 1)
+                            else:
+                                prev_stick = None
+                            coords = Joystick.polar(getStickPolar(token, prev_stick, j - rowIndex))
+                            if right: frames.putStick(True, j, coords)
+                            if left: frames.putStick(False, j, coords)
+                    else:
+                        polar_coords = getStickPolar(token, None, None)
+                        coords = Joystick.polar(polar_coords)
+                        if right: frames.setStick(True, frameRange, coords)
+                        if left: frames.setStick(False, frameRange, coords)
+
+                elif "a" in prefix: #accelerometer
+                    accel = Vector3f(*map(to_f2, map(float, token.split(";"))))
+
+                    if right: frames.setAccel(True, frameRange, accel)
+                    if left: frames.setAccel(False, frameRange, accel)
+
+                elif "g" in prefix: #gyroscope
+                    gyro = getGyroValues(token)
+
+                    if right: frames.setGyro(True, frameRange, gyro)
+                    if left: frames.setGyro(False, frameRange, gyro)
+
+            elif token == "m" or "m-" in token: #motion macros
+                if self.motion_offset != 0: #shifting motion earlier or later
+                    newStart = frameRange.start + self.motion_offset
+                    while newStart < 0: newStart += frameRange.step
+                    newStop = max(frameRange.stop + self.motion_offset, -1)
+                    frameRange = range(newStart, newStop, frameRange.step)
+
+                if self.motion_offset > 0: #ensure there are still enough frames if motion is shifted later
+                    self.script.addFrames(lastFrame(frameRange) + 1)
+
+                if token not in MOTION_MACROS: return
+
+                if not self.options.nxtas:
+                    accel_left, accel_right, ang_vel_left, ang_vel_right = MOTION_MACROS[token]
+                    gyro_left = Gyro.zero()
+                    gyro_right = Gyro.zero()
+                    gyro_left.ang_vel = Vector3f(*ang_vel_left)
+                    gyro_right.ang_vel = Vector3f(*ang_vel_right)
+
+                    frames.setAccel(False, frameRange, Vector3f(*accel_left))
+                    frames.setAccel(True, frameRange, Vector3f(*accel_right))
+                    frames.setGyro(False, frameRange, gyro_left)
+                    frames.setGyro(True, frameRange, gyro_right)
+                    frames.setMacro(frameRange)
+
+                else: #nx-tas motion keybinds
+                    frames.orButtons(frameRange, NXTAS_MOTION_BUTTONS[token])
+
+
+            else: #button or comment/invalid
+                frames.orButtons(frameRange, getButtonBin(token))
+
+        except Exception as e:
+            if self.options.debug: print(e)
+            raise CompileError("Syntax error(s) on line " + str(self.lineInNumber) + " prevented script generation")
+
+    #sets the stick of each frame from a token compiled by compileStickPolar, where ! on each frame is the stick just computed for the frame before it
+    #(frames counting down read the frames before them as they were, so they can only be computed this way if the token has no !)
+    def setStickExpression(self, frames, token, functions, frameRange:range, rowIndex, left, right, reads_previous):
+        r_function, theta_function = functions
+        lo, hi = toBounds(frameRange)
+        if reads_previous and lo - 1 >= 0: last = frames.getStick(right, lo - 1)
+        else: last = Joystick.zero()
+        sticks = []
+        for offset in range(lo - rowIndex, hi - rowIndex):
+            stick = None
+            if not reads_previous or (isPlainNumber(last.r) and isPlainNumber(last.theta)):
+                try: stick = Joystick.polar((r_function(last.r, offset), theta_function(last.theta, offset)))
+                except Exception: pass
+            if stick is None: #evaluate the text like getStickPolar does, which fails the same way as before or reads a number that is not plain
+                stick = Joystick.polar(getStickPolar(token, last if reads_previous else None, offset))
+            sticks.append(stick)
+            last = stick
+        if right: frames.setSticks(True, lo, sticks)
+        if left: frames.setSticks(False, lo, sticks)
+
+    #add a toggle for a button to be on indefinitely until its next input in the script ([*]) or a toggle to switch such a button off ([0]) – but the program will actually fill in the frames later
+    def addToggle(self, token, indexWrite, on):
+        try:
+            player_two = "c" in token
+            button_bin = getButtonBin(token)
+            self.script.addFrames(indexWrite + 1)
+            self.script.getFrames(player_two).addToggle(indexWrite, on, button_bin)
+        except Exception as e:
+            if self.options.debug: print(e)
+            raise CompileError("Syntax error(s) on line " + str(self.lineInNumber) + " prevented script generation")
+
+    #resolves the toggles and angular velocities of the frames before frame end, then writes them out STREAM_CHUNK_FRAMES at a time
+    def flushFrames(self, writer:ScriptWriter, end):
+        while self.script.frames_P1.first < end:
+            self.flushChunk(writer, min(end, self.script.frames_P1.first + STREAM_CHUNK_FRAMES))
+
+    def flushChunk(self, writer:ScriptWriter, end):
+        clock = self.timePhase("parse", self.phaseClock)
+        sources = self.script.players()
+        players = [frames.cut(end) for frames in sources]
+        for source, frames in zip(sources, players):
+            resolveToggles(frames)
+            source.carry = frames.carry
+        clock = self.timePhase("toggles", clock)
+
+        #calculate angular velocity if gyroscope and angular velocity are not independent, or calculate proper gyroscope if a motion macro is used
+        #angular velocity is change in gyroscope in degrees times -3/400
+        if not self.independent_gyro:
+            calculateAngularVelocity(players)
+        clock = self.timePhase("angular velocity", clock)
+
+        for frames in players:
+            frames.expand()
+        clock = self.timePhase("expand", clock)
+
+        #find the frames that are not empty (in 2P, frames are only empty if both are empty), which are the only ones written
+        keep = nonEmptyRanges(players) if self.options.remove_empty else None
+        clock = self.timePhase("skip empty", clock)
+
+        writer.write(players, keep)
+        self.phaseClock = self.timePhase("write", clock)
+
+    def timePhase(self, phase, start): #adds the time since start to phase, returning the current time
+        now = time.perf_counter()
+        self.phaseSeconds[phase] += now - start
+        if self.profile is not None: self.profile.endPhase(phase)
+        return now
+
+    def streamed(self, var): #fails for a setting that would change frames that were already written out while streaming
+        raise CompileError("Error: $" + var + " must be set before line " + str(self.lineInNumber) + " when streaming, since earlier frames were already written out (run without -s)")
+
+#compiles the text of a script, returning the LunaKit binary script or the nx-TAS script as bytes
+def compile(source, options:CompileOptions=None) -> bytes:
+    compiler = Compiler(options)
+    if compiler.options.nxtas:
+        outf = io.StringIO()
+        compiler.compile(io.StringIO(source), outf)
+        return outf.getvalue().encode()
+    outf = io.BytesIO()
+    compiler.compile(io.StringIO(source), outf)
+    return outf.getvalue()
+
+#compiles the script at path into outpath, with compiler if given
+#with the dump option, the debug dump is written to outpath-debug.csv, or to a .npy file per channel in the directory outpath-debug
+#without a compiler, the columns are separated as the file type of path says, whatever the separator in options
+#the output is written to a temporary file that only replaces outpath once the whole script has compiled, so errors never leave a partial output
+#returns the compiled Script
+def compileFile(path, outpath, options:CompileOptions=None, compiler:Compiler=None):
+    if compiler is None:
+        compiler = Compiler(dataclasses.replace(options or CompileOptions(), separator=separatorFor(path) or "\t"))
+    options = compiler.options
+    dumped = debugOutputs(options, outpath)
+    outputs = [outpath] + list(dumped.values())
+    temporary = [output + ".tmp" for output in outputs]
+    try:
+        with open(path) as f, open(temporary[0], "w" if options.nxtas else "wb") as outf, contextlib.ExitStack() as stack:
+            debugFiles = [stack.enter_context(open(name, "w" if options.debug_format == "csv" else "wb")) for name in temporary[1:]]
+            debugDump = None
+            if options.debug_format == "csv" and options.dump:
+                debugDump = CSVDump(debugFiles[0], options.debug_channels, options.debug_first, options.debug_stop)
+            elif options.dump:
+                debugDump = NPYDump(dict(zip(dumped, debugFiles)), options.debug_first, options.debug_stop)
+            script = compiler.compile(f, outf, debugDump)
+        for source, output in zip(temporary, outputs):
+            os.replace(source, output)
+    finally:
+        for source in temporary:
+            if os.path.exists(source): os.remove(source)
+    return script
+
+def debugOutputs(options:CompileOptions, outpath): #paths of the debug dump of outpath by channel (or by None for the CSV dump)
+    if not options.dump: return {}
+    for channel in options.debug_channels:
+        if channel not in DEBUG_CHANNELS: raise CompileError("Error: Unknown debug channel " + channel + " (the channels are " + ", ".join(DEBUG_CHANNELS) + ")")
+    if options.debug_format == "csv": return {None: outpath + "-debug.csv"}
+    if options.debug_format != "npy": raise CompileError("Error: Unknown debug format " + options.debug_format + " (the formats are csv and npy)")
+    directory = outpath + "-debug"
+    os.makedirs(directory, exist_ok=True)
+    channels = ["frame", "player"] + [channel for channel in DEBUG_CHANNELS if channel in options.debug_channels]
+    return {channel: os.path.join(directory, channel + ".npy") for channel in channels}
+
+def separatorFor(path): #the separator between the columns of a script file, or None if the file type is not supported
+    if path.endswith(".tsv") or path.endswith(".txt"): return "\t"
+    if path.endswith(".csv"): return ","
+    return None
@@ -0,0 +1,165 @@
+import re
+import functools
+import operator
+
+DIVISION_REGEX = re.compile("\\/(?=[ \\(]*\\.?[0-9])") #a / followed by a number is division rather than a loop
+WHOLE_MATH_REGEX = re.compile("^(([0-9,\\. \\+\\-\\*÷\\(\\)])+([\\+\\-\\*÷])([0-9,\\. \\+\\-\\*÷\\(\\)])+)$")
+INNER_MATH_REGEX = re.compile("([\\(\\,\\;\\[])(([0-9,\\. \\+\\-\\*÷\\(\\)])+([\\+\\-\\*÷])([0-9,\\. \\+\\-\\*÷\\(\\)])+)([\\)\\,\\;\\]])")
+
+@functools.lru_cache(maxsize=65536)
+def evaluateMath(token, whole_token): #evaluates math expressions
+    token = DIVISION_REGEX.sub('÷', token) #replace division / with ÷ to differentiate from loops
+    if whole_token: #match math expressions that take up the whole token
+        math_regex = WHOLE_MATH_REGEX
+        group = 1
+    else: #match math expressions that begin/end with parentheses, commas, brackets, or semicolons
+        math_regex = INNER_MATH_REGEX
+        group = 2
+    while match_obj := math_regex.search(token): #evaluate math operations
+        try:
+            value = str(compileExpression(match_obj.group(group))())
+        except (ExpressionError, ValueError, ArithmeticError, TypeError, RecursionError):
+            break #handles bad match groups with parentheses
+        #replace the math expression with its evaluation
+        evaluated = token[:match_obj.start(group)] + value + token[match_obj.end(group):]
+        if evaluated == token: break
+        token = evaluated
+
+    return token.lower()
+
+class ExpressionError(ValueError):
+    pass
+
+EXPRESSION_TOKEN_REGEX = re.compile(" *(?:([0-9]+\\.?[0-9]*|\\.[0-9]+)|(\\*\\*|[-+*/÷(),!@]))")
+EXPRESSION_OPERATORS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, '÷': operator.truediv, '**': operator.pow}
+
+#compiles an arithmetic expression (numbers, + - * / ÷ **, parentheses and commas, with Python's precedence and number types)
+#into a function that returns its value
+@functools.lru_cache(maxsize=65536)
+def compileExpression(text):
+    return parseExpression(text, None)
+
+#variables maps ! and @ to their values when the function is called, or is None if they are not allowed
+def parseExpression(text, variables):
+    tokens = []
+    position = 0
+    text = text.rstrip(' ')
+    while position < len(text):
+        match_obj = EXPRESSION_TOKEN_REGEX.match(text, position)
+        if match_obj is None: raise ExpressionError("Invalid expression " + text)
+        number, symbol = match_obj.groups()
+        tokens.append(parseNumber(number) if number is not None else symbol)
+        position = match_obj.end()
+    parser = ExpressionParser(tokens, variables)
+    function = parser.parseList()
+    if parser.position != len(tokens): raise ExpressionError("Invalid expression " + text)
+    return function
+
+def parseNumber(text): #number literal as Python reads it: a float if it has a decimal point, otherwise an int without leading zeros
+    if '.' in text: return float(text)
+    if len(text) > 1 and text[0] == '0' and text.strip('0') != '': raise ExpressionError("Invalid number " + text)
+    return int(text)
+
+#recursive descent parser building the function for a list of expression tokens (numbers and symbols)
+class ExpressionParser:
+    def __init__(self, tokens, variables=None):
+        self.tokens = tokens
+        self.variables = variables
+        self.position = 0
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, *symbols): #consumes and returns the next token if it is one of symbols
+        token = self.peek()
+        if isinstance(token, str) and token in symbols:
+            self.position += 1
+            return token
+        return None
+
+    def parseList(self): #expressions separated by commas make a tuple
+        items = [self.parseSum()]
+        if self.peek() != ',': return items[0]
+        while self.take(','):
+            if self.peek() is None or self.peek() == ')': break
+            items.append(self.parseSum())
+        return lambda: tuple(item() for item in items)
+
+    def parseSum(self):
+        left = self.parseProduct()
+        while symbol := self.take('+', '-'):
+            left = binaryOperation(EXPRESSION_OPERATORS[symbol], left, self.parseProduct())
+        return left
+
+    def parseProduct(self):
+        left = self.parseUnary()
+        while symbol := self.take('*', '/', '÷'):
+            left = binaryOperation(EXPRESSION_OPERATORS[symbol], left, self.parseUnary())
+        return left
+
+    def parseUnary(self):
+        if symbol := self.take('+', '-'):
+            operand = self.parseUnary()
+            if symbol == '-': return lambda: -operand()
+            return lambda: +operand()
+        return self.parsePower()
+
+    def parsePower(self):
+        base = self.parseAtom()
+        if self.take('**'):
+            return binaryOperation(operator.pow, base, self.parseUnary())
+        return base
+
+    def parseAtom(self):
+        token = self.peek()
+        if token is None: raise ExpressionError("Unexpected end of expression")
+        self.position += 1
+        if not isinstance(token, str):
+            return lambda: token
+        if token == '(':
+            if self.take(')'): return lambda: ()
+            inner = self.parseList()
+            if not self.take(')'): raise ExpressionError("Missing )")
+            return inner
+        if token in "!@" and self.variables is not None:
+            variables = self.variables
+            return lambda: variables[token]
+        raise ExpressionError("Unexpected " + token)
+
+def binaryOperation(function, left, right):
+    return lambda: function(left(), right())
+
+#True if str(value) is written without an exponent, inf or nan, which are the only numbers evaluateMath can read back in an expression
+def isPlainNumber(value):
+    return not isinstance(value, float) or value == 0 or 1e-4 <= abs(value) < 1e16
+
+#compiles a stick coordinate using ! (the coordinate on the previous frame) and @ (frames since the start of the row) into a function of their values,
+#which gives the same number as replacing them in the text with evaluateLast and evaluateCurrentFrame as long as their values are plain numbers
+#returns None if the text can only be evaluated that way (if it is not arithmetic, or uses ** which binds tighter than the sign of a value replacing ! or @)
+@functools.lru_cache(maxsize=65536)
+def compileStickExpression(text):
+    if "!" not in text and "@" not in text: #the same on every frame
+        try: value = float(evaluateMath(text, True))
+        except ValueError: return None
+        return lambda last, offset: value
+    text = DIVISION_REGEX.sub('÷', text)
+    if text.strip() in ("!", "@"): #a lone symbol is not math, so it is just read as a number
+        symbol = text.strip()
+        return lambda last, offset: float(last if symbol == "!" else offset)
+    if "**" in text or not WHOLE_MATH_REGEX.match(text.replace("!", "1").replace("@", "1")): return None
+    variables = {}
+    try: function = parseExpression(text, variables)
+    except (ExpressionError, RecursionError): return None
+    def evaluate(last, offset):
+        variables["!"] = last
+        variables["@"] = offset
+        return float(function())
+    return evaluate
+
+def evaluateLast(token, prev): #replaces any ! marks with prev, then calls evaluateMath
+    token = token.replace('!', str(prev))
+    return evaluateMath(token, True)
+
+def evaluateCurrentFrame(token, offset): #replaces any @ marks with offset, then calls evaluateMath
+    token = token.replace('@', str(offset))
+    return evaluateMath(token, True)
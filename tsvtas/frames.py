@@ -0,0 +1,514 @@
+import math
+import bisect
+import functools
+from array import array
+from dataclasses import dataclass, field
+from typing import NamedTuple
+
+ANG_VEL_FACTOR = -3/200.0
+
+#default gyroscope rotation is 3x3 identity matrix
+
+@dataclass
+class Vector2f:
+    x: float
+    y: float
+
+    @staticmethod
+    def zero():
+        return Vector2f(0, 0)
+
+
+@dataclass
+class Vector3f:
+    x: float
+    y: float
+    z: float
+
+    @staticmethod
+    def zero():
+        return Vector3f(0, 0, 0)
+
+    @staticmethod
+    def default_accel():
+        #return Vector3f(0, -1, 0)
+        return Vector3f(0, 0, 0)
+    
+#sticks and matrices are immutable tuples, so the ones made from the same values by the caches below can be shared, including in the timelines
+class Joystick(NamedTuple):
+    r: float
+    theta: float
+    x: float
+    y: float
+
+    @staticmethod
+    def zero():
+        return Joystick(0, 0, 0, 0)
+    
+    @staticmethod
+    def polar(r_theta): #accepts pair with r and theta, snaps to nearest 2^16-representable float
+        return polarJoystick(r_theta[0], r_theta[1], zeroSigns(r_theta))
+    
+    @staticmethod
+    def cartesian(x, y): #note that with how polar rounds the r and theta may not generate the x and y
+        return Joystick(math.sqrt(x**2 + y**2), math.degrees(math.atan2(y, x)), x, y)
+
+#signs of the values if any of them is zero, since 0.0 and -0.0 are the same key to a cache but not always the same input
+def zeroSigns(values):
+    if 0 not in values: return None
+    return tuple([math.copysign(1, value) for value in values])
+
+@functools.lru_cache(maxsize=65536, typed=True) #scripts hold the same few stick positions over and over
+def polarJoystick(r, theta, zero_signs):
+    return Joystick(r, theta, int(32767 * r * math.cos(math.radians(theta))) / 32767.0, int(32767 * r * math.sin(math.radians(theta))) / 32767.0)
+
+class Matrix33f(NamedTuple):
+    xx: float
+    xy: float
+    xz: float
+    yx: float
+    yy: float
+    yz: float
+    zx: float
+    zy: float
+    zz: float
+
+    @staticmethod
+    def ident():
+        return Matrix33f(1, 0, 0,
+                         0, 1, 0,
+                         0, 0, 1)
+
+
+@dataclass
+class Gyro:
+    euler: Vector3f
+    direction: Matrix33f
+    ang_vel: Vector3f
+
+    @staticmethod
+    def zero():
+        return Gyro(Vector3f.zero(), Matrix33f.ident(), Vector3f.zero())
+
+
+IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0) #3x3 identity matrix, row by row
+
+#first frame and frame after the last of a range (which may count down for negative durations)
+def toBounds(frameRange:range):
+    if len(frameRange) == 0: return 0, 0
+    return min(frameRange[0], frameRange[-1]), max(frameRange[0], frameRange[-1]) + 1
+
+#splits changes, (start, stop, function) that may overlap, where they overlap, so that each piece applies the functions of every change covering it in order
+def overlay(changes):
+    bounds = sorted({bound for start, stop, function in changes for bound in (start, stop)})
+    pieces = []
+    for start, stop in zip(bounds, bounds[1:]):
+        functions = [function for a, b, function in changes if a <= start and stop <= b]
+        if len(functions) == 1: pieces.append((start, stop, functions[0]))
+        elif functions: pieces.append((start, stop, lambda value, functions=functions: functools.reduce(lambda value, function: function(value), functions, value)))
+    return pieces
+
+#stores one input channel as runs of frames with the same value: values[k] holds from frame starts[k] until frame starts[k + 1]
+#writing a range of frames splits at most two runs, so long holds cost the same as single frames
+class Timeline:
+    def __init__(self, default):
+        self.starts = [0]
+        self.values = [default]
+
+    def __getitem__(self, i):
+        return self.values[bisect.bisect_right(self.starts, i) - 1]
+
+    def split(self, i): #index of the run starting at frame i, splitting the run that contains frame i if needed
+        k = bisect.bisect_right(self.starts, i) - 1
+        if self.starts[k] != i:
+            k += 1
+            self.starts.insert(k, i)
+            self.values.insert(k, self.values[k - 1])
+        return k
+
+    def set(self, lo, hi, value): #writes value to frames lo through hi - 1
+        if lo >= hi: return
+        a = self.split(lo)
+        b = self.split(hi)
+        self.starts[a:b] = [lo]
+        self.values[a:b] = [value]
+
+    def setEach(self, lo, values): #writes each of values to one frame, starting at frame lo
+        if not values: return
+        a = self.split(lo)
+        b = self.split(lo + len(values))
+        self.starts[a:b] = range(lo, lo + len(values))
+        self.values[a:b] = values
+
+    def update(self, lo, hi, function): #replaces the value of each run in frames lo through hi - 1 with function(value)
+        if lo >= hi: return
+        a = self.split(lo)
+        b = self.split(hi)
+        self.values[a:b] = map(function, self.values[a:b])
+
+    #replaces the value of frames lo through hi - 1 covered by pieces with function(value), repeating the pieces every period frames
+    #pieces are sorted (start, stop, function) counted from lo that do not overlap and fit within one period, and the last repeat is cut off at hi
+    def tile(self, lo, hi, period, pieces):
+        if lo >= hi: return
+        a = self.split(lo)
+        b = self.split(hi)
+        oldStarts = self.starts[a:b] + [hi]
+        oldValues = self.values[a:b]
+        starts = []
+        values = []
+        k = 0
+        i = lo
+
+        def fill(stop, function): #the runs of frames i through stop - 1, with function applied unless it is None
+            nonlocal i, k
+            while i < stop:
+                while oldStarts[k + 1] <= i: k += 1
+                starts.append(i)
+                values.append(oldValues[k] if function is None else function(oldValues[k]))
+                i = min(oldStarts[k + 1], stop)
+
+        for base in range(lo, hi, period):
+            for start, stop, function in pieces:
+                if base + start >= hi: break
+                fill(base + start, None)
+                fill(min(base + stop, hi), function)
+        fill(hi, None)
+        self.starts[a:b] = starts
+        self.values[a:b] = values
+
+    def window(self, lo, hi): #(starts, values) of the runs covering frames lo through hi - 1, counting frames from lo
+        a = bisect.bisect_right(self.starts, lo) - 1
+        b = bisect.bisect_left(self.starts, hi)
+        return [max(start - lo, 0) for start in self.starts[a:b]], self.values[a:b]
+
+    def trim(self, lo): #forgets the runs that end before frame lo
+        k = bisect.bisect_right(self.starts, lo) - 1
+        del self.starts[:k]
+        del self.values[:k]
+
+    #yields (start, stop, values) over frames 0 through length - 1, split wherever any of the timelines changes run
+    @staticmethod
+    def segments(timelines, length):
+        bounds = sorted({start for timeline in timelines for start in timeline.starts if start < length})
+        bounds.append(length)
+        indices = [0] * len(timelines)
+        for start, stop in zip(bounds, bounds[1:]):
+            values = []
+            for j, timeline in enumerate(timelines):
+                k = indices[j]
+                while k + 1 < len(timeline.starts) and timeline.starts[k + 1] <= start: k += 1
+                indices[j] = k
+                values.append(timeline.values[k])
+            yield start, stop, values
+
+    #writes frames 0 through length - 1 into columns, one column per element of the values (or a single column for numbers)
+    def expand(self, columns, length):
+        for column in columns: del column[:]
+        for start, stop, (value,) in Timeline.segments((self,), length):
+            if len(columns) == 1: value = (value,)
+            for column, element in zip(columns, value):
+                column.extend(array(column.typecode, [element]) * (stop - start))
+
+#stores every frame of one player as a struct of arrays with one array per channel, instead of one object per frame
+#while the script is parsed every channel is a Timeline, and the arrays are only filled in by expand() once all inputs are resolved
+#sticks are stored as (r, theta, x, y) columns, vectors as (x, y, z) columns and gyro directions as 9 columns (xx, xy, ..., zz)
+#every floating-point channel is stored as doubles so the debug dump shows the values as computed; the LunaKit writer rounds them to 32-bit floats
+class FrameTable:
+    def __init__(self, second_player):
+        self.second_player = second_player
+        self.first = 0 #frames before this one have been written out, so only later frames are stored
+        self.length = 0
+        self.step = array('L')
+        self.buttons = array('L')
+        self.buttonsOn = array('L')
+        self.buttonsOff = array('L')
+        self.left_stick = tuple(array('d') for _ in range(4))
+        self.right_stick = tuple(array('d') for _ in range(4))
+        self.accel_left = tuple(array('d') for _ in range(3))
+        self.accel_right = tuple(array('d') for _ in range(3))
+        self.gyro_left_euler = tuple(array('d') for _ in range(3))
+        self.gyro_left_direction = tuple(array('d') for _ in range(9))
+        self.gyro_left_ang_vel = tuple(array('d') for _ in range(3))
+        self.gyro_right_euler = tuple(array('d') for _ in range(3))
+        self.gyro_right_direction = tuple(array('d') for _ in range(9))
+        self.gyro_right_ang_vel = tuple(array('d') for _ in range(3))
+        self.macro = array('B')
+
+        default_accel = Vector3f.default_accel()
+        default_accel = (default_accel.x, default_accel.y, default_accel.z)
+        #(column, default value) for every input channel, and for the toggle bitmasks that are resolved after parsing
+        self.inputs = ([(self.buttons, 0)]
+                       + [(column, 0.0) for column in self.left_stick + self.right_stick]
+                       + list(zip(self.accel_left, default_accel)) + list(zip(self.accel_right, default_accel))
+                       + [(column, 0.0) for column in self.gyro_left_euler] + list(zip(self.gyro_left_direction, IDENTITY)) + [(column, 0.0) for column in self.gyro_left_ang_vel]
+                       + [(column, 0.0) for column in self.gyro_right_euler] + list(zip(self.gyro_right_direction, IDENTITY)) + [(column, 0.0) for column in self.gyro_right_ang_vel]
+                       + [(self.macro, 0)])
+        self.toggles = [(self.buttonsOn, 0), (self.buttonsOff, 0)]
+
+        #timelines indexed by right (False for left, True for right) where there is one per side
+        self.buttons_timeline = Timeline(0)
+        self.buttonsOn_timeline = Timeline(0)
+        self.buttonsOff_timeline = Timeline(0)
+        self.stick_timeline = (Timeline((0.0, 0.0, 0.0, 0.0)), Timeline((0.0, 0.0, 0.0, 0.0)))
+        self.accel_timeline = (Timeline(default_accel), Timeline(default_accel))
+        self.gyro_timeline = (Timeline((0.0, 0.0, 0.0) + IDENTITY), Timeline((0.0, 0.0, 0.0) + IDENTITY)) #euler angles then direction
+        self.ang_vel_timeline = (Timeline((0.0, 0.0, 0.0)), Timeline((0.0, 0.0, 0.0)))
+        self.macro_timeline = Timeline(0)
+        #(timeline, the columns it expands into)
+        self.expansions = [(self.buttons_timeline, (self.buttons,)), (self.buttonsOn_timeline, (self.buttonsOn,)), (self.buttonsOff_timeline, (self.buttonsOff,)),
+                           (self.stick_timeline[False], self.left_stick), (self.stick_timeline[True], self.right_stick),
+                           (self.accel_timeline[False], self.accel_left), (self.accel_timeline[True], self.accel_right),
+                           (self.gyro_timeline[False], self.gyro_left_euler + self.gyro_left_direction), (self.gyro_timeline[True], self.gyro_right_euler + self.gyro_right_direction),
+                           (self.ang_vel_timeline[False], self.gyro_left_ang_vel), (self.ang_vel_timeline[True], self.gyro_right_ang_vel),
+                           (self.macro_timeline, (self.macro,))]
+        self.toggled = False #True once a toggle has been added, since otherwise there are no toggles to resolve
+        self.carry = 0 #buttons toggled on before the first stored frame and not yet pressed or toggled off
+        self.previous_gyro = None #(left, right) gyro of the frame before the first stored frame
+        self.lowest = None #lowest frame written since this was last reset, which must not be before first
+        self.log = None #if set to a list, every write is appended to it so it can be replayed later
+
+    #logs a write as (second player, method name, arguments)
+    def record(self, name, args):
+        self.log.append((self.second_player, name, args))
+
+    def __len__(self): #frames stored, starting at frame first
+        return self.length - self.first
+
+    def extend(self, end): #add default frames through frame end - 1
+        if self.log is not None: self.record("extend", (end,))
+        self.length = max(self.length, end)
+
+    def bounds(self, frameRange:range): #first frame and frame after the last of a range, which must be within the frames added so far
+        lo, hi = toBounds(frameRange)
+        if hi > self.length: raise IndexError("frame " + str(hi - 1) + " out of range")
+        if lo < hi and (self.lowest is None or lo < self.lowest): self.lowest = lo
+        return lo, hi
+
+    def getStick(self, right, i):
+        if i >= self.length: raise IndexError("frame " + str(i) + " out of range")
+        return Joystick(*self.stick_timeline[right][i])
+
+    def setStick(self, right, frameRange:range, stick:Joystick):
+        if self.log is not None: self.record("setStick", (right, frameRange, stick))
+        self.stick_timeline[right].set(*self.bounds(frameRange), stick)
+
+    def putStick(self, right, i, stick:Joystick): #set the stick of a single frame
+        self.setStick(right, range(i, i + 1), stick)
+
+    def setSticks(self, right, i, sticks): #set the sticks of frames i, i + 1, ... to each (r, theta, x, y) of sticks
+        if self.log is not None: self.record("setSticks", (right, i, sticks))
+        self.bounds(range(i, i + len(sticks)))
+        self.stick_timeline[right].setEach(i, sticks)
+
+    def getAccel(self, right, i):
+        if i >= self.length: raise IndexError("frame " + str(i) + " out of range")
+        return Vector3f(*self.accel_timeline[right][i])
+
+    def setAccel(self, right, frameRange:range, accel:Vector3f):
+        if self.log is not None: self.record("setAccel", (right, frameRange, accel))
+        self.accel_timeline[right].set(*self.bounds(frameRange), (accel.x, accel.y, accel.z))
+
+    def setAccels(self, right, i, accels): #set the accelerometers of frames i, i + 1, ... to each (x, y, z) of accels
+        if self.log is not None: self.record("setAccels", (right, i, accels))
+        self.bounds(range(i, i + len(accels)))
+        self.accel_timeline[right].setEach(i, accels)
+
+    def getGyro(self, right, i):
+        if i >= self.length: raise IndexError("frame " + str(i) + " out of range")
+        gyro = self.gyro_timeline[right][i]
+        return Gyro(Vector3f(*gyro[:3]), Matrix33f(*gyro[3:]), Vector3f(*self.ang_vel_timeline[right][i]))
+
+    def setGyro(self, right, frameRange:range, gyro:Gyro):
+        if self.log is not None: self.record("setGyro", (right, frameRange, gyro))
+        lo, hi = self.bounds(frameRange)
+        d = gyro.direction
+        self.gyro_timeline[right].set(lo, hi, (gyro.euler.x, gyro.euler.y, gyro.euler.z, d.xx, d.xy, d.xz, d.yx, d.yy, d.yz, d.zx, d.zy, d.zz))
+        self.ang_vel_timeline[right].set(lo, hi, (gyro.ang_vel.x, gyro.ang_vel.y, gyro.ang_vel.z))
+
+    #set the gyros of frames i, i + 1, ... to each (euler x, euler y, euler z, xx, xy, ..., zz) of gyros and (x, y, z) of ang_vels
+    def setGyros(self, right, i, gyros, ang_vels):
+        if self.log is not None: self.record("setGyros", (right, i, gyros, ang_vels))
+        self.bounds(range(i, i + len(gyros)))
+        self.gyro_timeline[right].setEach(i, gyros)
+        self.ang_vel_timeline[right].setEach(i, ang_vels)
+
+    def setMacro(self, frameRange:range):
+        if self.log is not None: self.record("setMacro", (frameRange,))
+        self.macro_timeline.set(*self.bounds(frameRange), 1)
+
+    def orButtons(self, frameRange:range, button_bin):
+        if self.log is not None: self.record("orButtons", (frameRange, button_bin))
+        self.buttons_timeline.update(*self.bounds(frameRange), lambda buttons: buttons | button_bin)
+
+    def addToggle(self, i, on, button_bin): #toggle buttons on ([*]) or off ([0]) from frame i
+        if self.log is not None: self.record("addToggle", (i, on, button_bin))
+        timeline = self.buttonsOn_timeline if on else self.buttonsOff_timeline
+        self.toggled = True
+        timeline.update(*self.bounds(range(i, i + 1)), lambda buttons: buttons | button_bin)
+
+    #(timeline, frame range, function of the old value) of each timeline changed by a logged write, or None for writes that tile() cannot repeat
+    def changes(self, name, args):
+        if name == "orButtons":
+            frameRange, button_bin = args
+            return [(self.buttons_timeline, frameRange, lambda buttons: buttons | button_bin)]
+        elif name == "setStick":
+            right, frameRange, stick = args
+            return [(self.stick_timeline[right], frameRange, lambda _: stick)]
+        elif name == "setAccel":
+            right, frameRange, accel = args
+            value = (accel.x, accel.y, accel.z)
+            return [(self.accel_timeline[right], frameRange, lambda _: value)]
+        elif name == "setGyro":
+            right, frameRange, gyro = args
+            d = gyro.direction
+            value = (gyro.euler.x, gyro.euler.y, gyro.euler.z, d.xx, d.xy, d.xz, d.yx, d.yy, d.yz, d.zx, d.zy, d.zz)
+            ang_vel = (gyro.ang_vel.x, gyro.ang_vel.y, gyro.ang_vel.z)
+            return [(self.gyro_timeline[right], frameRange, lambda _: value), (self.ang_vel_timeline[right], frameRange, lambda _: ang_vel)]
+        elif name == "setMacro":
+            return [(self.macro_timeline, args[0], lambda _: 1)]
+        return None
+
+    #repeats the logged writes made to frames lo - period through lo - 1 every period frames until frame hi, cutting off the last repeat at hi
+    #each timeline is rewritten once over the whole range, instead of once per write per repeat
+    def tile(self, lo, hi, period, writes):
+        if self.log is not None: self.record("tile", (lo, hi, period, writes))
+        lo, hi = self.bounds(range(lo, hi))
+        changes = {} #timeline -> (start, stop, function) of its changes, counted from frame lo - period
+        for name, args in writes:
+            for timeline, frameRange, function in self.changes(name, args):
+                start, stop = toBounds(frameRange)
+                if start < stop: changes.setdefault(timeline, []).append((start - lo + period, stop - lo + period, function))
+        for timeline, pieces in changes.items():
+            timeline.tile(lo, hi, period, overlay(pieces))
+
+    #moves the frames before frame end into a new table, which counts its frames from 0 but keeps their steps
+    #this table keeps the run holding the last frame moved so that the frame before its first one can still be read
+    def cut(self, end):
+        table = FrameTable(self.second_player)
+        table.first = self.first
+        table.length = end
+        table.toggled = self.toggled
+        table.carry = self.carry
+        if self.first > 0: table.previous_gyro = (self.gyro_timeline[False][self.first - 1], self.gyro_timeline[True][self.first - 1])
+        for (timeline, _), (source, _) in zip(table.expansions, self.expansions):
+            timeline.starts, timeline.values = source.window(self.first, end)
+            source.trim(end - 1)
+        self.first = end
+        return table
+
+    def expand(self): #fill in the columns from the timelines once every input has been parsed and resolved
+        del self.step[:]
+        self.step.extend(range(self.first, self.length))
+        for timeline, columns in self.expansions:
+            timeline.expand(columns, len(self))
+
+    def isDefault(self, i): #True if frame i has no inputs (toggles are not inputs)
+        for column, default in self.inputs:
+            if column[i] != default: return False
+        return True
+
+    def select(self, ranges): #new table holding only the frames in the given (start, stop) ranges, which keep their original steps
+        table = FrameTable(self.second_player)
+        table.length = sum(stop - start for start, stop in ranges)
+        for (column, _), (source, _) in zip([(table.step, 0)] + table.inputs + table.toggles, [(self.step, 0)] + self.inputs + self.toggles):
+            for start, stop in ranges:
+                column.extend(source[start:stop])
+        return table
+
+
+@dataclass
+class Script:
+    change_stage_name:str
+    change_stage_id:str
+    scenario_no:int
+    is_two_player:bool
+    startPosition:Vector3f
+    frames_P1:FrameTable = field(default_factory=lambda: FrameTable(False))
+    frames_P2:FrameTable = field(default_factory=lambda: FrameTable(True))
+
+    def getFrames(self, player_two):
+        if player_two: return self.frames_P2
+        else: return self.frames_P1
+
+    def addFrames(self, end): #add frames through frame end - 1
+        self.frames_P1.extend(end)
+        if self.is_two_player:
+            self.frames_P2.extend(end)
+
+    # player 1 and player 2 tables in the order their frames are interleaved in the output
+    def players(self):
+        if self.is_two_player: return [self.frames_P1, self.frames_P2]
+        else: return [self.frames_P1]
+
+    def setLog(self, log): #log the writes to both players' frames to log, or stop logging if log is None
+        self.frames_P1.log = self.frames_P2.log = log
+
+    #repeats the logged writes made to frames lo - period through lo - 1 every period frames until frame hi (see FrameTable.tile)
+    def tile(self, lo, hi, period, log):
+        self.addFrames(hi)
+        for frames in (self.frames_P1, self.frames_P2):
+            writes = [(name, args) for player_two, name, args in log if player_two == frames.second_player and name != "extend"]
+            if writes: frames.tile(lo, hi, period, writes)
+
+    def replay(self, log): #repeat writes that were logged while parsing an earlier compile
+        for player_two, name, args in log:
+            getattr(self.getFrames(player_two), name)(*args)
+
+
+def to_f2(f4): #stores float with 2 byte precision if uncommented
+    #return int(f4 * 32767) / 32767.0
+    return f4
+
+# calculates needed angular velocities based on the gyroscope for both joy-cons of every player
+# within a run of the timelines the gyroscope does not change, so only the first frame of a run can have a nonzero angular velocity,
+# which is the change in euler angles from the run before times ANG_VEL_FACTOR unless a motion macro sets it
+def calculateAngularVelocity(players):
+    for frames in players:
+        if len(frames) == 0: continue
+        for right in (False, True):
+            ang_vel = frames.ang_vel_timeline[right]
+            starts, stops, values = zip(*Timeline.segments((frames.gyro_timeline[right], ang_vel, frames.macro_timeline), len(frames)))
+            gyros, written, macros = zip(*values)
+            if frames.previous_gyro is not None: gyros = (frames.previous_gyro[right],) + gyros #the first run continues from the frames already written out
+            eulers = [[gyro[k] for gyro in gyros] for k in range(3)]
+            changed = list(zip(*([ANG_VEL_FACTOR*(b - a) for a, b in zip(euler, euler[1:])] for euler in eulers)))
+            #a held angle gives ANG_VEL_FACTOR*0.0 = -0.0 like the per-frame difference it replaces (not 0.0), so the output stays byte-identical
+            held = list(zip(*([ANG_VEL_FACTOR*(a - a) for a in euler[-len(starts):]] for euler in eulers)))
+            if frames.previous_gyro is None: changed.insert(0, None) #frame 0 keeps its angular velocity
+
+            ang_vel.starts = []
+            ang_vel.values = []
+            for k in range(len(starts)):
+                ang_vel.starts.append(starts[k])
+                ang_vel.values.append(written[k] if macros[k] or changed[k] is None else changed[k])
+                if stops[k] - starts[k] > 1 and not macros[k]:
+                    ang_vel.starts.append(starts[k] + 1)
+                    ang_vel.values.append(held[k])
+
+#(start, stop) ranges of the frames that have inputs for at least one of the players, for skipping empty frames
+#whether a frame is empty can only change where a run of one of the timelines starts, so each run is checked once
+def nonEmptyRanges(players):
+    timelines = [timeline for frames in players for timeline, columns in frames.expansions]
+    ranges = []
+    for start, stop, values in Timeline.segments(timelines, len(players[0])):
+        if all(frames.isDefault(start) for frames in players): continue
+        if ranges and ranges[-1][1] == start: ranges[-1] = (ranges[-1][0], stop)
+        else: ranges.append((start, stop))
+    return ranges
+
+# turns toggled buttons on for every frame until they are pressed or toggled off, separately for each player
+# the toggles only change where a run of buttons or toggles starts, so each run is resolved at once
+def resolveToggles(frames:FrameTable):
+    if not frames.toggled or len(frames) == 0: return
+    buttons = frames.buttons_timeline
+    starts = []
+    values = []
+    carry = frames.carry #buttons toggled on and not yet pressed or toggled off
+    for start, stop, (pressed, buttonsOn, buttonsOff) in Timeline.segments((buttons, frames.buttonsOn_timeline, frames.buttonsOff_timeline), len(frames)):
+        carry |= buttonsOn
+        carry &= ~(pressed | buttonsOff)
+        starts.append(start)
+        values.append(pressed | carry)
+    buttons.starts, buttons.values = starts, values
+    frames.carry = carry
+
@@ -0,0 +1,79 @@
+#profiling of compiles (the --profile option of tsv-tas.py): the time and peak memory of each phase, counters of the work done, and the slowest lines
+#set a Compiler's profile to a Profile before a compile to fill it in, or use profileFile
+import time
+import heapq
+import tracemalloc
+
+from .compiler import Compiler, PHASES, compileFile, splitVariables, eulerRotation
+from .frames import polarJoystick
+from .expressions import evaluateMath, compileExpression
+
+#counters shown in the report, with the lru caches whose misses are counted (each miss is work that was actually done rather than looked up)
+COUNTERS = ("rows", "tokens", "parseToken calls", "math regex passes", "variable regex passes", "expressions compiled", "stick positions", "rotation matrices", "frames")
+CACHE_COUNTERS = {"math regex passes": evaluateMath, "variable regex passes": splitVariables, "expressions compiled": compileExpression,
+                  "stick positions": polarJoystick, "rotation matrices": eulerRotation}
+
+#tracing memory slows down allocations several times over, so a Profile either times the phases or measures their memory, but not both
+class Profile:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.peakMemory = dict.fromkeys(PHASES, 0) #most bytes allocated at once during each phase
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lines = [] #(seconds, line number, tokens) of each row with inputs
+
+    def start(self):
+        self.cacheMisses = {name: cache.cache_info().misses for name, cache in CACHE_COUNTERS.items()}
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.startTime = time.perf_counter()
+
+    def endPhase(self, phase): #called at the end of each stretch of time spent in phase
+        if not self.trace_memory: return
+        self.peakMemory[phase] = max(self.peakMemory[phase], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    def addLine(self, lineNumber, lineIn, seconds):
+        self.lines.append((seconds, lineNumber, lineIn))
+
+    def finish(self, compiler):
+        self.total = time.perf_counter() - self.startTime
+        if self.trace_memory: tracemalloc.stop()
+        self.seconds = dict(compiler.phaseSeconds)
+        self.counters["rows"] = compiler.lineInNumber - 1
+        self.counters["frames"] = compiler.script.frames_P1.length * len(compiler.script.players())
+        for name, cache in CACHE_COUNTERS.items():
+            self.counters[name] = cache.cache_info().misses - self.cacheMisses[name]
+
+    def report(self, top=10, separator="\t"): #the profile as text, listing the top slowest lines
+        lines = ["%-18s %10s %18s" % ("Phase", "Time (s)", "Peak memory (MB)")]
+        for phase in PHASES:
+            lines.append("%-18s %10.4f %18.2f" % (phase, self.seconds[phase], self.peakMemory[phase] / 2**20))
+        lines.append("%-18s %10.4f %18.2f" % ("total", self.total, max(self.peakMemory.values()) / 2**20))
+        lines.append("")
+        for counter in COUNTERS:
+            lines.append("%-22s %d" % (counter, self.counters[counter]))
+        lines.append("")
+        lines.append("Slowest lines:")
+        for seconds, lineNumber, lineIn in heapq.nlargest(top, self.lines):
+            lines.append("%8.4f s  line %-6d %s" % (seconds, lineNumber, separator.join(lineIn)))
+        return "\n".join(lines)
+
+#compiles path into outpath with compiler, then again with memory traced by a new compiler with the same options, returning the profile of both
+def profileFile(compiler:Compiler, path, outpath):
+    profile = Profile()
+    compiler.profile = profile
+    try:
+        compileFile(path, outpath, compiler=compiler)
+    finally:
+        compiler.profile = None
+
+    memory = Compiler(compiler.options)
+    memory.profile = Profile(trace_memory=True)
+    try:
+        compileFile(path, outpath, compiler=memory)
+    finally:
+        if tracemalloc.is_tracing(): tracemalloc.stop()
+    profile.peakMemory = memory.profile.peakMemory
+    return profile
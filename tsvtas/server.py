@@ -0,0 +1,101 @@
+#long running compile server: the compiler stays imported and its caches stay warm between compiles, so a compile does not pay for starting python
+#usage: python3 -m tsvtas.server [port, host:port or path of a Unix socket]
+#by default the server listens on a Unix socket only the user running it can open (see client.defaultAddress)
+#scripts are compiled by running tsv-tas.py with the c option, which sends the compile to this server
+import os
+import sys
+import stat
+import time
+import traceback
+import socketserver
+
+from .client import parseAddress, serverAddress, formatAddress, defaultAddress
+from .compiler import Compiler, CompileOptions, CompileError, CompileCache, compileFile, separatorFor
+
+COMPILER_LIMIT = 64 #most scripts whose compiler and row cache are kept between compiles
+
+class CompileHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        flags, infile, outfile = self.rfile.readline().decode().rstrip("\n").split("\t")
+        start = time.perf_counter()
+        ok, message = self.server.compileScript(flags, infile, outfile)
+        status = ("ok" if ok else "error") + "\t%.6f" % (time.perf_counter() - start)
+        self.wfile.write((status + "\n" + message).encode())
+
+class CompileServer:
+    def __init__(self):
+        self.compilers = {} #(option letters, input path) -> Compiler, with the least recently used first
+
+    def getCompiler(self, flags, infile):
+        key = (flags, infile)
+        compiler = self.compilers.pop(key, None)
+        if compiler is None:
+            options = CompileOptions("n" in flags, "e" in flags, "d" in flags, "s" in flags, separatorFor(infile), "d" in flags)
+            compiler = Compiler(options, CompileCache())
+            if len(self.compilers) >= COMPILER_LIMIT: del self.compilers[next(iter(self.compilers))]
+        self.compilers[key] = compiler
+        return compiler
+
+    def compileScript(self, flags, infile, outfile): #returns whether the script compiled and the message for the client
+        infile, outfile = os.path.abspath(infile), os.path.abspath(outfile)
+        if separatorFor(infile) is None: return False, "Error: Invalid file type"
+        if not allowedOutput(flags, infile, outfile):
+            return False, "Error: The compile server only writes output files in the same directory as the script, ending in .txt for nx-TAS scripts and without an extension otherwise"
+        compiler = self.getCompiler(flags, infile)
+        try:
+            compileFile(infile, outfile, compiler=compiler)
+        except (CompileError, OSError) as e:
+            compiler.cache = CompileCache()
+            return False, str(e)
+        except Exception: #keep serving after a bug in the compiler
+            compiler.cache = CompileCache()
+            return False, traceback.format_exc()
+        return True, "Script successfully generated"
+
+#output files are only written next to the script with the extension tsv-tas.py gives them, so a request cannot overwrite any other file
+def allowedOutput(flags, infile, outfile):
+    return outfile != infile and os.path.dirname(outfile) == os.path.dirname(infile) and os.path.splitext(outfile)[1] == (".txt" if "n" in flags else "")
+
+#creates the directory of the default socket if needed, and fails unless it is a directory only this user can open
+def privateDirectory(directory):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        sys.exit("Error: " + directory + " is not a directory owned by you, so the compile server cannot put its socket there")
+    if info.st_mode & 0o077: os.chmod(directory, 0o700)
+
+class TCPCompileServer(CompileServer, socketserver.TCPServer):
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        CompileServer.__init__(self)
+        socketserver.TCPServer.__init__(self, address, CompileHandler)
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixCompileServer(CompileServer, socketserver.UnixStreamServer):
+        def __init__(self, address):
+            CompileServer.__init__(self)
+            if address == defaultAddress(): privateDirectory(os.path.dirname(address))
+            if os.path.exists(address): os.remove(address) #left behind by a server that did not shut down cleanly
+            umask = os.umask(0o177) #the socket is created readable and writable by this user only
+            try:
+                socketserver.UnixStreamServer.__init__(self, address, CompileHandler)
+            finally:
+                os.umask(umask)
+
+        def server_close(self):
+            socketserver.UnixStreamServer.server_close(self)
+            if os.path.exists(self.server_address): os.remove(self.server_address)
+
+def serve(address):
+    server = UnixCompileServer(address) if isinstance(address, str) else TCPCompileServer(address)
+    with server:
+        print("Compile server listening on " + formatAddress(address))
+        print("Press Ctrl+C to quit")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    serve(parseAddress(sys.argv[1]) if len(sys.argv) > 1 else serverAddress())
@@ -0,0 +1,192 @@
+#uploads compiled scripts to the Switch over FTP (the f option of tsv-tas.py)
+#uploads run on a background thread over one connection that is kept open between uploads and reopened when it fails,
+#and a script is not sent again if it has not changed since it was last uploaded
+#python3 -m tsvtas.upload checks the uploader against a stand-in FTP client
+import io
+import os
+import sys
+import json
+import ftplib
+import hashlib
+import tempfile
+import threading
+
+UPLOAD_DIRECTORY = "SMO/tas/scripts/" #directory on the SD card scripts are uploaded to
+UPLOAD_ATTEMPTS = 2 #tries of each upload, reconnecting after each failure
+
+def loadConfig(path="ftp_config.json"): #host, port, user and password of the FTP server
+    with open(path) as f:
+        config = json.load(f)
+    return config["ip"], int(config["port"]), config["user"], config["passwd"]
+
+class Uploader:
+    #connect is called with no arguments to make a new client (ftplib.FTP by default), so that a stand-in server can be used instead
+    #report is called with a message after each upload
+    def __init__(self, host, port, user, passwd, directory=UPLOAD_DIRECTORY, connect=ftplib.FTP, report=print):
+        self.address = (host, port)
+        self.login = (user, passwd)
+        self.directory = directory
+        self.connect = connect
+        self.report = report
+        self.client = None
+        self.pending = {} #remote name -> contents waiting to be uploaded, of which only the latest version of each script is kept
+        self.uploaded = {} #remote name -> hash of the contents last uploaded
+        self.busy = False
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def upload(self, path, name=None): #queues the file at path to be uploaded as name (path by default) in the upload directory
+        with open(path, "rb") as f:
+            contents = f.read() #read now, since the next compile may replace the file before it is sent
+        with self.condition:
+            self.pending[name if name is not None else path] = contents
+            self.condition.notify_all()
+
+    def wait(self): #blocks until every queued upload has finished
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending and not self.busy)
+
+    def close(self): #finishes the queued uploads, then closes the connection
+        self.wait()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    self.disconnect()
+                    return
+                name = next(iter(self.pending))
+                contents = self.pending.pop(name)
+                self.busy = True
+            try:
+                try:
+                    message = self.send(name, contents)
+                except Exception as e: #any other error of the client must not end the thread, or wait() and close() would block forever
+                    self.client = None #the connection may be in any state, so the next upload opens a new one
+                    message = "FTP error: " + str(e)
+                self.report(message)
+            except Exception as e: #likewise for errors in report
+                print("Error reporting an upload: " + str(e), file=sys.stderr)
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def send(self, name, contents): #uploads contents unless they were already uploaded, returning the message to report
+        digest = hashlib.sha256(contents).digest()
+        if self.uploaded.get(name) == digest: return "Script unchanged since the last upload, not uploaded again"
+        error = None
+        for _ in range(UPLOAD_ATTEMPTS):
+            try:
+                if self.client is None:
+                    client = self.connect()
+                    client.connect(host=self.address[0], port=self.address[1])
+                    client.login(user=self.login[0], passwd=self.login[1])
+                    self.client = client
+                result = self.client.storbinary("STOR " + self.directory + name, io.BytesIO(contents))
+            except (OSError, EOFError, ftplib.Error) as e: #the connection may have been closed by the server while idle
+                error = e
+                self.disconnect()
+                continue
+            if not result.startswith("2"): return "FTP error: " + result
+            self.uploaded[name] = digest
+            return "Script successfully uploaded"
+        return "FTP error: " + str(error)
+
+    def disconnect(self):
+        if self.client is None: return
+        try:
+            self.client.quit()
+        except (OSError, EOFError, ftplib.Error):
+            self.client.close()
+        self.client = None
+
+#an FTP client keeping uploads in memory, standing in for the Switch in check()
+#fail_stores is the number of uploads that fail before the connection is dropped, and error is what they raise
+class StandInFTP:
+    def __init__(self, server, fail_stores=0, error=ConnectionResetError):
+        self.server = server
+        self.fail_stores = fail_stores
+        self.error = error
+        self.open = False
+
+    def connect(self, host, port):
+        self.open = True
+        self.server["connections"] += 1
+
+    def login(self, user, passwd):
+        if not self.open: raise ftplib.error_perm("530 Not connected")
+
+    def storbinary(self, command, file):
+        if self.fail_stores > 0:
+            self.fail_stores -= 1
+            self.open = False
+            raise self.error("connection dropped")
+        self.server["files"][command[len("STOR "):]] = file.read()
+        self.server["stores"] += 1
+        return "226 Transfer complete"
+
+    def quit(self):
+        if not self.open: raise ConnectionResetError("connection dropped")
+        self.open = False
+        self.server["quits"] += 1
+
+    def close(self):
+        self.open = False
+
+#uploads to stand-in clients, checking that a dropped connection is reopened, that unchanged scripts are not sent again,
+#that unexpected errors of the client are reported without stopping uploads, and that close() finishes the queue and quits
+def check():
+    server = {"connections": 0, "stores": 0, "quits": 0, "files": {}}
+    failures = iter([1, 0, 0]) #the first connection drops on its first upload
+    clients = []
+    def connect():
+        clients.append(StandInFTP(server, next(failures, 0)))
+        return clients[-1]
+    reports = []
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "script")
+        def write(contents):
+            with open(path, "wb") as f: f.write(contents)
+
+        uploader = Uploader("127.0.0.1", 5000, "user", "passwd", directory="scripts/", connect=connect, report=reports.append)
+        write(b"first")
+        uploader.upload(path, "script")
+        uploader.wait()
+        if reports[-1] != "Script successfully uploaded" or server["connections"] != 2: problems.append("the dropped connection was not reopened")
+        uploader.upload(path, "script")
+        uploader.wait()
+        if server["stores"] != 1 or not reports[-1].startswith("Script unchanged"): problems.append("an unchanged script was uploaded again")
+        write(b"second")
+        uploader.upload(path, "script")
+        uploader.wait()
+        if server["files"].get("scripts/script") != b"second" or server["connections"] != 2: problems.append("a changed script was not uploaded over the open connection")
+
+        clients[-1].fail_stores, clients[-1].error = UPLOAD_ATTEMPTS, RuntimeError #an error no FTP client should raise
+        write(b"third")
+        uploader.upload(path, "script")
+        uploader.wait()
+        if not reports[-1].startswith("FTP error"): problems.append("an unexpected error of the client was not reported")
+        write(b"fourth")
+        uploader.upload(path, "script")
+        closer = threading.Thread(target=uploader.close, daemon=True)
+        closer.start()
+        closer.join(5)
+        if closer.is_alive(): problems.append("close() did not return")
+        elif server["files"].get("scripts/script") != b"fourth": problems.append("close() did not finish the queued upload")
+        elif server["quits"] != 1 or clients[-1].open: problems.append("close() did not quit the connection")
+    return problems
+
+if __name__ == "__main__":
+    problems = check()
+    for problem in problems: print("Failed: " + problem)
+    print("Uploader check " + ("failed" if problems else "passed"))
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,95 @@
+#the input vocabulary shared by the compiler, the nx-TAS writer and nx-tas-to-tsv-tas.py: buttons, motion macros and nx-TAS key names
+#everything is defined once here and turned into lookup tables when the module is imported
+import enum
+
+#bit index of each button in a LunaKit button bitmask
+class Button(enum.Enum):
+    cPadIdx_A = 0
+    cPadIdx_B = 1
+    cPadIdx_C = 2
+    cPadIdx_X = 3
+    cPadIdx_Y = 4
+    cPadIdx_Z = 5
+    cPadIdx_2 = 6 # R Stick Click
+    cPadIdx_1 = 7 # L Stick Click
+    cPadIdx_Home = 8
+    cPadIdx_Minus = 9
+    cPadIdx_Plus = 10
+    cPadIdx_Start = 11
+    cPadIdx_Select = 12
+    cPadIdx_ZL = 2
+    cPadIdx_ZR = 5
+    cPadIdx_L = 13
+    cPadIdx_R = 14
+    cPadIdx_Touch = 15
+    cPadIdx_Up = 16
+    cPadIdx_Down = 17
+    cPadIdx_Left = 18
+    cPadIdx_Right = 19
+    cPadIdx_LeftStickUp = 20
+    cPadIdx_LeftStickDown = 21
+    cPadIdx_LeftStickLeft = 22
+    cPadIdx_LeftStickRight = 23
+    cPadIdx_rightUp = 24
+    cPadIdx_rightDown = 25
+    cPadIdx_rightLeft = 26
+    cPadIdx_rightRight = 27
+    cPadIdx_Max = 28
+
+def bit(button:Button):
+    return 1 << button.value
+
+#TSV-TAS button name (lowercase, without the c of 2P) -> button bitmask
+BUTTON_BITS = {
+    "a": bit(Button.cPadIdx_A), "b": bit(Button.cPadIdx_B), "x": bit(Button.cPadIdx_X), "y": bit(Button.cPadIdx_Y),
+    "l": bit(Button.cPadIdx_L), "r": bit(Button.cPadIdx_R), "zl": bit(Button.cPadIdx_ZL), "zr": bit(Button.cPadIdx_ZR),
+    "plus": bit(Button.cPadIdx_Plus), "+": bit(Button.cPadIdx_Plus), "minus": bit(Button.cPadIdx_Minus), "-": bit(Button.cPadIdx_Minus),
+    "dp-l": bit(Button.cPadIdx_Left), "dp-u": bit(Button.cPadIdx_Up), "dp-r": bit(Button.cPadIdx_Right), "dp-d": bit(Button.cPadIdx_Down),
+    "ls": bit(Button.cPadIdx_1), "rs": bit(Button.cPadIdx_2),
+}
+
+#(button bit, nx-TAS key name) in the order the keys are listed in an nx-TAS line
+NXTAS_KEYS = [(bit(button), name) for button, name in (
+    (Button.cPadIdx_A, "KEY_A"), (Button.cPadIdx_B, "KEY_B"), (Button.cPadIdx_X, "KEY_X"), (Button.cPadIdx_Y, "KEY_Y"),
+    (Button.cPadIdx_L, "KEY_L"), (Button.cPadIdx_R, "KEY_R"), (Button.cPadIdx_ZL, "KEY_ZL"), (Button.cPadIdx_ZR, "KEY_ZR"),
+    (Button.cPadIdx_Plus, "KEY_PLUS"), (Button.cPadIdx_Minus, "KEY_MINUS"),
+    (Button.cPadIdx_Left, "KEY_DLEFT"), (Button.cPadIdx_Right, "KEY_DRIGHT"), (Button.cPadIdx_Up, "KEY_DUP"), (Button.cPadIdx_Down, "KEY_DDOWN"),
+    (Button.cPadIdx_1, "KEY_LSTICK"), (Button.cPadIdx_2, "KEY_RSTICK"))]
+
+#motion macro -> (left accelerometer, right accelerometer, left angular velocity, right angular velocity) in LunaKit scripts
+#the side a macro does not move keeps the default accelerometer (0, 0, 0) and no angular velocity
+MOTION_MACROS = {
+    "m": ((0, 3, 0), (0, 0, 0), (-3, 0, 0), (0, 0, 0)),
+    "m-u": ((0, 3, 0), (0, 0, 0), (-3, 0, 0), (0, 0, 0)),
+    "m-d": ((0, 3, 0), (0, 0, 0), (3, 0, 0), (0, 0, 0)),
+    "m-l": ((-3, 0, 0), (0, 0, 0), (0, 2, 0), (0, 0, 0)),
+    "m-r": ((3, 0, 0), (0, 0, 0), (0, -2, 0), (0, 0, 0)),
+    "m-uu": ((0, 3, 0), (0, 3, 0), (-2, 0, 0), (-2, 0, 0)),
+    "m-dd": ((0, 3, 0), (0, 3, 0), (2, 0, 0), (2, 0, 0)),
+    "m-ll": ((-3, 0, 0), (-3, 0, 0), (0, 2, 0), (0, 2, 0)),
+    "m-rr": ((3, 0, 0), (3, 0, 0), (0, -2, 0), (0, -2, 0)),
+}
+
+#motion macro -> buttons it presses in nx-TAS scripts, where motion is bound to L and the d-pad
+NXTAS_MOTION_BUTTONS = {
+    "m": BUTTON_BITS["l"],
+    "m-u": BUTTON_BITS["l"] | BUTTON_BITS["dp-u"],
+    "m-d": BUTTON_BITS["l"] | BUTTON_BITS["dp-d"],
+    "m-l": BUTTON_BITS["l"] | BUTTON_BITS["dp-l"],
+    "m-r": BUTTON_BITS["l"] | BUTTON_BITS["dp-r"],
+    "m-uu": BUTTON_BITS["dp-u"],
+    "m-dd": BUTTON_BITS["dp-d"],
+    "m-ll": BUTTON_BITS["dp-l"],
+    "m-rr": BUTTON_BITS["dp-r"],
+}
+
+#nx-TAS key name -> the TSV-TAS token nx-tas-to-tsv-tas.py writes for it, which turns L and the d-pad back into motion macros
+NXTAS_TOKENS = {
+    "KEY_A": "a", "KEY_B": "b", "KEY_X": "x", "KEY_Y": "y",
+    "KEY_L": "m-d", "KEY_R": "r", "KEY_ZL": "zl", "KEY_ZR": "zr",
+    "KEY_PLUS": "+", "KEY_MINUS": "-",
+    "KEY_DUP": "m-uu", "KEY_DRIGHT": "m-rr", "KEY_DDOWN": "m-dd", "KEY_DLEFT": "m-ll",
+    "KEY_LSTICK": "ls", "KEY_RSTICK": "rs",
+}
+
+MOTION_TOKENS = frozenset(MOTION_MACROS) #tokens that are motion macros
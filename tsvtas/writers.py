@@ -0,0 +1,203 @@
+import sys
+import csv
+import struct
+import functools
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .frames import Script, FrameTable
+from .vocabulary import NXTAS_KEYS
+
+LUNAKIT_HEADER = struct.Struct("<4sI?3xi128s128s3f") #magic, frame count, is two player, scenario, stage name, entrance, start position
+LUNAKIT_FRAME = struct.Struct("<I?3xI2f2f3f3f9f3f9f3f") #step, second player, buttons, sticks, accelerometers, left gyro, right gyro
+
+@functools.lru_cache(maxsize=None) #scripts only use a handful of distinct button combinations
+def nxTAS_Buttons(buttons): #converts button int into string list of buttons for nx-TAS format
+    if buttons == 0: return "NONE"
+    return ";".join(name for bit, name in NXTAS_KEYS if buttons & bit)
+
+def quantizeStick(value): #stick position from -1 to 1 as an nx-TAS stick value
+    return str(int(value * 32767))
+
+@functools.lru_cache(maxsize=65536)
+def nxTAS_Suffix(buttons, lx, ly, rx, ry): #everything in an nx-TAS line after the frame number
+    return " " + nxTAS_Buttons(buttons) + " " + quantizeStick(lx) + ";" + quantizeStick(ly) + " " + quantizeStick(rx) + ";" + quantizeStick(ry) + "\n"
+
+#writes the output (and debug dump) of a script a chunk of frames at a time, as soon as the frames are finished
+#outf is a text file for nx-TAS output and a seekable binary file for LunaKit output, whose header is filled in by finish()
+#debugDump is a CSVDump or NPYDump
+#with the -e option the empty frames are skipped while the frames are written, rather than copied out of the tables beforehand
+class ScriptWriter:
+    def __init__(self, script:Script, nxtas, outf, debugDump=None):
+        self.script = script
+        self.nxtas = nxtas
+        self.outf = outf
+        self.debugDump = debugDump
+        self.num_output_frames = 0
+        if not nxtas:
+            self.header = outf.tell()
+            outf.write(bytes(LUNAKIT_HEADER.size)) #filled in once the number of frames is known
+
+    #writes the frames of one chunk, given as each player's table, keeping only the frames in the (start, stop) ranges of keep if it is given
+    def write(self, players, keep=None):
+        if keep is None: keep = [(0, len(players[0]))]
+        self.num_output_frames += sum(stop - start for start, stop in keep) * len(players)
+
+        if self.debugDump is not None or not self.nxtas:
+            selected = players if keep == [(0, len(players[0]))] else [frames.select(keep) for frames in players]
+        if self.debugDump is not None:
+            self.debugDump.write(selected)
+
+        if self.nxtas:
+            self.outf.write(nxTAS_Lines(players, keep))
+        else:
+            writeLunaKitFrames(self.outf, selected)
+
+    def finish(self):
+        if self.debugDump is not None:
+            self.debugDump.finish()
+        if not self.nxtas:
+            end = self.outf.tell()
+            self.outf.seek(self.header)
+            writeLunaKitHeader(self.outf, self.script, self.num_output_frames)
+            self.outf.seek(end)
+
+#the nx-TAS lines of the frames of a chunk in the (start, stop) ranges of keep, with the players' lines interleaved
+#each line is the frame number followed by a suffix that is looked up once for each run of frames with the same buttons and sticks
+def nxTAS_Lines(players, keep):
+    lines = []
+    for frames in players:
+        player_lines = []
+        buttons, (_, _, lx, ly), (_, _, rx, ry) = frames.buttons, frames.left_stick, frames.right_stick
+        runs = sorted({start for timeline in (frames.buttons_timeline,) + frames.stick_timeline for start in timeline.starts})
+        for lo, hi in keep:
+            bounds = runs[bisect_right(runs, lo):bisect_left(runs, hi)]
+            for start, stop in zip([lo] + bounds, bounds + [hi]):
+                suffix = nxTAS_Suffix(buttons[start], lx[start], ly[start], rx[start], ry[start])
+                if stop - start == 1: player_lines.append(str(frames.first + start) + suffix)
+                else: player_lines += [step + suffix for step in map(str, range(frames.first + start, frames.first + stop))]
+        lines.append(player_lines)
+    return "".join(lines[0] if len(lines) == 1 else itertools.chain.from_iterable(zip(*lines)))
+
+#writes the script in the LunaKit binary format: a header followed by one fixed-size record per frame
+#the frame section is built column by column in a single buffer of 4-byte words rather than packed frame by frame
+def writeLunaKitHeader(outf, script:Script, num_output_frames):
+    outf.write(LUNAKIT_HEADER.pack(b"BOOB", num_output_frames, script.is_two_player, script.scenario_no,
+                                   bytes(script.change_stage_name, encoding="ascii"), bytes(script.change_stage_id, encoding="ascii"),
+                                   script.startPosition.x, script.startPosition.y, script.startPosition.z))
+
+def writeLunaKitFrames(outf, players):
+    num_frames = len(players[0])
+    columns = []
+    for frames in players:
+        columns += ([frames.step, array('L', [frames.second_player]) * num_frames, frames.buttons]
+                    + list(frames.left_stick[2:] + frames.right_stick[2:] + frames.accel_left + frames.accel_right)
+                    + list(frames.gyro_left_direction + frames.gyro_left_ang_vel + frames.gyro_right_direction + frames.gyro_right_ang_vel))
+    stride = len(columns) #words per output frame (two records in 2P)
+    assert stride * 4 == LUNAKIT_FRAME.size * len(players)
+
+    #repeat the first output frame for every frame, then overwrite only the columns whose values change
+    first = array('I')
+    for column in columns: first += toWords(column[:1])
+    words = first * num_frames
+    for offset, column in enumerate(columns):
+        if not isConstant(column): words[offset::stride] = toWords(column)
+    if sys.byteorder == "big": words.byteswap()
+    outf.write(words)
+
+def toWords(column): #converts a column to 4-byte words, storing floating-point columns as 32-bit floats
+    if column.typecode == 'd': column = array('f', column)
+    if column.typecode != 'f': return array('I', column)
+    words = array('I')
+    words.frombytes(column.tobytes())
+    return words
+
+def isConstant(column): #True if every value in the column has the same bytes
+    return column.tobytes() == column[:1].tobytes() * len(column)
+
+#channels of the debug dump, in the order they are dumped: name -> (CSV column names, columns of a FrameTable)
+#every row of the dump also starts with the frame number and whether it is player 2's
+DEBUG_CHANNELS = {
+    "buttons": ("Buttons,ButtonsOn,ButtonsOff", lambda frames: (frames.buttons, frames.buttonsOn, frames.buttonsOff)),
+    "ls": ("lx.r,ls.theta,ls.x,ls.y", lambda frames: frames.left_stick),
+    "rs": ("rs.r,rs.theta,rs.x,rs.y", lambda frames: frames.right_stick),
+    "la": ("la.x,la.y,la.z", lambda frames: frames.accel_left),
+    "ra": ("ra.x,ra.y,ra.z", lambda frames: frames.accel_right),
+    "lg.r": ("lg.r.xx,lg.r.xy,lg.r.xz,lg.r.yx,lg.r.yy,lg.r.yz,lg.r.zx,lg.r.zy,lg.r.zz", lambda frames: frames.gyro_left_direction),
+    "lg.v": ("lg.v.x,lg.v.y,lg.v.z", lambda frames: frames.gyro_left_ang_vel),
+    "rg.r": ("rg.r.xx,rg.r.xy,rg.r.xz,rg.r.yx,rg.r.yy,rg.r.yz,rg.r.zx,rg.r.zy,rg.r.zz", lambda frames: frames.gyro_right_direction),
+    "rg.v": ("rg.v.x,rg.v.y,rg.v.z", lambda frames: frames.gyro_right_ang_vel),
+}
+
+def dumpedRange(frames, first, stop): #indices of the frames of a chunk whose frame numbers are from first up to stop (either of which can be None)
+    lo = 0 if first is None else bisect_left(frames.step, first)
+    hi = len(frames.step) if stop is None else bisect_left(frames.step, stop)
+    return lo, max(lo, hi)
+
+#writes the debug dump as one CSV file, with a row per frame (two in 2P)
+class CSVDump:
+    def __init__(self, outf, channels=tuple(DEBUG_CHANNELS), first=None, stop=None):
+        self.channels = [DEBUG_CHANNELS[channel][1] for channel in DEBUG_CHANNELS if channel in channels]
+        self.first, self.stop = first, stop
+        self.csv_writer = csv.writer(outf, delimiter = ',')
+        outf.write(",".join(["Frame,2ndPlayer"] + [DEBUG_CHANNELS[channel][0] for channel in DEBUG_CHANNELS if channel in channels]) + "\n")
+
+    def write(self, players):
+        lo, hi = dumpedRange(players[0], self.first, self.stop)
+        rows = []
+        for frames in players:
+            columns = [frames.step[lo:hi], itertools.repeat(frames.second_player)]
+            columns += [column[lo:hi] for channel in self.channels for column in channel(frames)]
+            rows.append(zip(*columns))
+        self.csv_writer.writerows(rows[0] if len(rows) == 1 else itertools.chain.from_iterable(zip(*rows)))
+
+    def finish(self):
+        pass
+
+NPY_HEADER_SIZE = 128 #bytes of the header of each .npy file, which is rewritten with the number of rows once it is known
+NPY_TYPES = {'L': ('I', "u4"), 'd': ('d', "f8"), 'f': ('f', "f4"), '?': ('B', "b1")} #column typecode -> (typecode stored, numpy type)
+
+#writes the debug dump as arrays in the .npy format (readable with numpy.load, which can memory-map them), one per channel
+#files maps "frame", "player" and the name of each channel to the binary file its array is written to
+#each array has a row per frame (two in 2P) like the CSV dump, with a column for each of the channel's CSV columns
+class NPYDump:
+    def __init__(self, files, first=None, stop=None):
+        self.files = files
+        self.first, self.stop = first, stop
+        self.rows = 0
+        self.types = {} #name -> (typecode stored, numpy type, columns)
+        empty = FrameTable(False)
+        for name, outf in files.items():
+            columns = self.channelColumns(name, empty, 0, 0)
+            self.types[name] = NPY_TYPES['?' if name == "player" else columns[0].typecode] + (len(columns),)
+            outf.write(bytes(NPY_HEADER_SIZE)) #filled in by finish()
+
+    def channelColumns(self, name, frames, lo, hi):
+        if name == "frame": return [frames.step[lo:hi]]
+        if name == "player": return [array('B', [frames.second_player]) * (hi - lo)]
+        return [column[lo:hi] for column in DEBUG_CHANNELS[name][1](frames)]
+
+    def write(self, players):
+        lo, hi = dumpedRange(players[0], self.first, self.stop)
+        for name, outf in self.files.items():
+            columns = [column for frames in players for column in self.channelColumns(name, frames, lo, hi)]
+            typecode = self.types[name][0]
+            #interleave the columns of every player into rows
+            rows = array(typecode, bytes(array(typecode).itemsize * len(columns) * (hi - lo)))
+            for offset, column in enumerate(columns):
+                rows[offset::len(columns)] = column if column.typecode == typecode else array(typecode, column)
+            outf.write(rows)
+        self.rows += (hi - lo) * len(players)
+
+    def finish(self):
+        for name, outf in self.files.items():
+            _, numpy_type, width = self.types[name]
+            end = outf.tell()
+            outf.seek(0)
+            outf.write(npyHeader(("|" if numpy_type == "b1" else "<" if sys.byteorder == "little" else ">") + numpy_type, (self.rows,) if width == 1 else (self.rows, width)))
+            outf.seek(end)
+
+def npyHeader(descr, shape):
+    header = "{'descr': '" + descr + "', 'fortran_order': False, 'shape': " + repr(shape) + ", }"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", NPY_HEADER_SIZE - 10) + header.ljust(NPY_HEADER_SIZE - 11).encode() + b"\n"